@@ -0,0 +1,116 @@
+import ssl
+import json
+import asyncio
+
+import aio_pika
+from aio_pika.pool import Pool
+from loguru import logger
+from app import config
+
+
+class AsyncTheftDetectionProducer:
+    """
+    asyncio-native counterpart of TheftDetectionProducer built on aio-pika.
+
+    One robust connection is kept for the life of the process (aio-pika re-opens it and its
+    channels after a broker restart) and publishes go through a small pool of channels in
+    publisher-confirm mode. A batch is published concurrently and awaited as a whole, so its
+    confirms come back together instead of one round-trip per message.
+    """
+
+    def __init__(self, host=config.RABBITMQ_HOST_PRODUCER,
+                 queue_name=config.RABBITMQ_QUEUE_NAME_PRODUCER,
+                 port=config.RABBITMQ_PORT_PRODUCER,
+                 username=config.RABBITMQ_USER_PRODUCER,
+                 password=config.RABBITMQ_PASS_PRODUCER,
+                 channels=config.RABBITMQ_PRODUCER_CHANNELS,
+                 connect_retries=3,
+                 max_backoff=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.queue_name = queue_name
+        self.connect_retries = connect_retries
+        self.max_backoff = max_backoff
+        self.connection = None
+        self.connect_lock = asyncio.Lock()
+        self.channel_pool = Pool(self._open_channel, max_size=channels)
+
+    async def _open_channel(self):
+        connection = await self.connect()
+        channel = await connection.channel(publisher_confirms=True)
+        await channel.declare_queue(self.queue_name, durable=True)
+        return channel
+
+    async def connect(self):
+        """
+        Return the shared connection, connecting with exponential backoff. Gives up after
+        `connect_retries` attempts so callers (the outbox) can retry later instead of hanging.
+        """
+        async with self.connect_lock:
+            if self.connection is not None and not self.connection.is_closed:
+                return self.connection
+            # Same trust settings as the blocking producer
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            delay = 1
+            for attempt in range(1, self.connect_retries + 1):
+                try:
+                    self.connection = await aio_pika.connect_robust(
+                        host=self.host,
+                        port=self.port,
+                        login=self.username,
+                        password=self.password,
+                        ssl=True,
+                        ssl_context=context,
+                        timeout=10,
+                    )
+                    logger.info(":::connected to RABBITMQ:::")
+                    return self.connection
+                except Exception as e:
+                    if attempt == self.connect_retries:
+                        raise
+                    logger.error(f"Error connecting to RabbitMQ, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_backoff)
+
+    @staticmethod
+    def detection(trace_id, cam_id, s3_uri, timestamp, theft_res, store_id):
+        return {
+            'trace_id': trace_id,
+            'camera_id': cam_id,
+            's3_url': s3_uri,
+            'timestamp' : str(timestamp),
+            'theft_probability' : float(theft_res),
+            'store_id' : store_id
+        }
+
+    async def publish_batch(self, detections):
+        """Publish detection dicts and return once the broker has confirmed every one of them."""
+        if config.STORE_MESSAGE_RMQ != "True":
+            return
+        async with self.channel_pool.acquire() as channel:
+            await asyncio.gather(*(
+                channel.default_exchange.publish(
+                    aio_pika.Message(
+                        body=json.dumps(detection).encode(),
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                        message_id=detection['trace_id'],
+                        content_type='application/json',
+                    ),
+                    routing_key=self.queue_name,
+                    mandatory=True,
+                )
+                for detection in detections
+            ))
+        logger.info(f" [x] Sent {len(detections)} detections")
+
+    async def publish_detection(self, trace_id, cam_id, s3_uri, timestamp, theft_res, store_id):
+        await self.publish_batch([self.detection(trace_id, cam_id, s3_uri, timestamp, theft_res, store_id)])
+
+    async def close(self):
+        await self.channel_pool.close()
+        if self.connection is not None:
+            await self.connection.close()
@@ -28,6 +28,8 @@ class TheftDetectionProducer:
         self.channel = self.connection.channel()
         self.queue_name = queue_name
         self.channel.queue_declare(queue=self.queue_name, durable=True)
+        # basic_publish raises if the broker nacks or cannot route the message
+        self.channel.confirm_delivery()
     def publish_detection(self,trace_id, cam_id, s3_uri,timestamp,theft_res,store_id):   # trace_id, camera_id, url,timestamp
         detection = {
             'trace_id': trace_id,
@@ -43,8 +45,10 @@ class TheftDetectionProducer:
                 routing_key=self.queue_name,
                 body=json.dumps(detection),
                 properties=pika.BasicProperties(
-                    delivery_mode=pika.DeliveryMode.Persistent
-                )
+                    delivery_mode=pika.DeliveryMode.Persistent,
+                    message_id=trace_id
+                ),
+                mandatory=True
             )
         # if config.DEFAULT_MESSAGE_RMQ == "True": # by default True
         #     self.channel.queue_declare(queue="theft_detections_multicam", durable=True)
@@ -4,7 +4,7 @@ import os
 
 CONSECUTIVE_PRED = int(os.getenv("CONTINOUS_PREDICTION", 20))
 THEFT_THRESHOLD =float(os.getenv('THEFT_THRESHOLD',0.7))
-GPU_LIMIT = int(os.getenv('GPU_LIMIT'))
+GPU_LIMIT = int(os.getenv('GPU_LIMIT', 0))
 SKIP_FRAME = int(os.getenv('SKIP_FRAME', 300))
 
 
@@ -15,8 +15,90 @@ CAMERA_NO = os.getenv('CAMERA_NO','102')
 RTSP_URL = os.getenv('CAMERA_URL',None)
 CLIENT_TYPE = os.getenv('CLIENT_TYPE',"rtsp")
 RABBITMQ_CAMERAID = os.getenv("RABBITMQ_CAMERAID",None)
-FRAME_LENGTH = int(os.getenv("FRAME_LENGTH"))
+RABBITMQ_CONSUMER_MODE = os.getenv("RABBITMQ_CONSUMER_MODE","push")
+RABBITMQ_PREFETCH = int(os.getenv("RABBITMQ_PREFETCH",64))
+RABBITMQ_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE",None)
+RABBITMQ_EXCHANGE_TYPE = os.getenv("RABBITMQ_EXCHANGE_TYPE","direct")
+RABBITMQ_ROUTING_KEY = os.getenv("RABBITMQ_ROUTING_KEY","{camera_id}")
+FRAME_DECODE_WORKERS = int(os.getenv("FRAME_DECODE_WORKERS",2))
+FRAME_DECODE_REDUCTION = os.getenv("FRAME_DECODE_REDUCTION","auto")
+CHUNK_INDEX_PATH = os.getenv('CHUNK_INDEX_PATH', "chunk_index.db")
+CHUNK_INDEX_RETENTION_HOURS = float(os.getenv('CHUNK_INDEX_RETENTION_HOURS', 24))
+# Defaults to .chunks.sock inside the chunk directory shared by ChunkReceiver and FrameProcessor
+CHUNK_NOTIFY_SOCKET = os.getenv('CHUNK_NOTIFY_SOCKET', None)
+CHUNK_WAIT_TIMEOUT = float(os.getenv('CHUNK_WAIT_TIMEOUT', 1))
+CHUNK_DECODE_SIZE = os.getenv('CHUNK_DECODE_SIZE', "640x480")
+RABBITMQ_HOST_PRODUCER = os.getenv("RABBITMQ_HOST_PRODUCER",'localhost')
+RABBITMQ_PORT_PRODUCER = int(os.getenv("RABBITMQ_PORT_PRODUCER",5671))
+RABBITMQ_USER_PRODUCER = os.getenv("RABBITMQ_USER_PRODUCER",'guest')
+RABBITMQ_PASS_PRODUCER = os.getenv("RABBITMQ_PASS_PRODUCER",'guest')
+RABBITMQ_QUEUE_NAME_PRODUCER = os.getenv("RABBITMQ_QUEUE_NAME_PRODUCER",'theft_detections')
+STORE_MESSAGE_RMQ = os.getenv("STORE_MESSAGE_RMQ","True")
+RABBITMQ_PRODUCER_CHANNELS = int(os.getenv("RABBITMQ_PRODUCER_CHANNELS",4))
+FRAME_LENGTH = int(os.getenv("FRAME_LENGTH", 30))
+ALERT_QUEUE = os.getenv('ALERT_QUEUE', "theft_alerts")
+ALERT_POP_TIMEOUT = int(os.getenv('ALERT_POP_TIMEOUT', 5))
+ALERT_MAX_ATTEMPTS = int(os.getenv('ALERT_MAX_ATTEMPTS', 3))
+# One alert's worth of frames; an alert copies its range out when it fires
+SHM_RING_SLOTS = int(os.getenv('SHM_RING_SLOTS', FRAME_LENGTH + 200))
+EVIDENCE_MODE = os.getenv('EVIDENCE_MODE', "frames")
+EVIDENCE_DIR = os.getenv('EVIDENCE_DIR', "evidence_segments")
+EVIDENCE_SEGMENT_SECONDS = int(os.getenv('EVIDENCE_SEGMENT_SECONDS', 2))
+EVIDENCE_KEEP_SECONDS = int(os.getenv('EVIDENCE_KEEP_SECONDS', 120))
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', "alert_outbox.db")
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_RETENTION_HOURS = float(os.getenv('OUTBOX_RETENTION_HOURS', 24))
+KAFKA_HIGH_THROUGHPUT = os.getenv('KAFKA_HIGH_THROUGHPUT', "False")
+KAFKA_LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', 20))
+KAFKA_MAX_BATCH_SIZE = int(os.getenv('KAFKA_MAX_BATCH_SIZE', 262144))
+KAFKA_COMPRESSION = os.getenv('KAFKA_COMPRESSION', "lz4")
+KAFKA_PROBABILITY_TOPIC = os.getenv('KAFKA_PROBABILITY_TOPIC', None)
+CAPTURE_THREADED = os.getenv('CAPTURE_THREADED', "False")
+CAPTURE_BUFFER_SIZE = int(os.getenv('CAPTURE_BUFFER_SIZE', 2))
+CAPTURE_DROP_POLICY = os.getenv('CAPTURE_DROP_POLICY', "keep-latest")
+CAPTURE_READ_TIMEOUT = float(os.getenv('CAPTURE_READ_TIMEOUT', 10))
+
+#Person detection
+DETECT_STRIDE_MIN = int(os.getenv('DETECT_STRIDE_MIN', 1))
+DETECT_STRIDE_MAX = int(os.getenv('DETECT_STRIDE_MAX', 1))
+DETECT_FAST_MOTION = float(os.getenv('DETECT_FAST_MOTION', 0.02))
+MOTION_GATE = os.getenv('MOTION_GATE', "False")
+MOTION_THRESHOLD = float(os.getenv('MOTION_THRESHOLD', 0.005))
+MOTION_PIXEL_DELTA = int(os.getenv('MOTION_PIXEL_DELTA', 25))
+MOTION_MAX_SKIP = int(os.getenv('MOTION_MAX_SKIP', 100))
+DETECTION_SERVER_ADDRESS = os.getenv('DETECTION_SERVER_ADDRESS', None)
+DETECTION_MAX_BATCH = int(os.getenv('DETECTION_MAX_BATCH', 8))
+DETECTION_MAX_WAIT_MS = float(os.getenv('DETECTION_MAX_WAIT_MS', 10))
+DETECTION_TIMEOUT = float(os.getenv('DETECTION_TIMEOUT', 2))
 
 
 MODEL_PATH = os.getenv('MODEL_PATH',None)
+# Split encoder/head models, built by `python model_conversion.py --target split`
+ENCODER_MODEL_PATH = os.getenv('ENCODER_MODEL_PATH', None)
+HEAD_MODEL_PATH = os.getenv('HEAD_MODEL_PATH', None)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'tensorflow')
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', 0))
+PREDICTION_STRIDE = int(os.getenv('PREDICTION_STRIDE', 5))
+
+
+#Storage
+AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID', None)
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY', None)
+AWS_BUCKET = os.getenv('AWS_BUCKET', None)
+AWS_OBJECT_NAME = os.getenv('AWS_OBJECT_NAME', 'theft')
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-2')
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', "s3")
+LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', "theft_videos_store")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 20))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+UPLOAD_PART_CONCURRENCY = int(os.getenv('UPLOAD_PART_CONCURRENCY', 4))
+UPLOAD_RETRIES = int(os.getenv('UPLOAD_RETRIES', 3))
+
 
+#Shared inference server
+INFERENCE_SERVER_ADDRESS = os.getenv('INFERENCE_SERVER_ADDRESS', None)
+INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', 8))
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', 20))
+INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', 10))
+BATCH_SERVER_AUTHKEY = os.getenv('BATCH_SERVER_AUTHKEY', None)
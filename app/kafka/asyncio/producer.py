@@ -4,12 +4,20 @@ import os, ssl
 from uuid import uuid4
 from aiokafka import AIOKafkaProducer
 
+from app import config
 from app.utils.aws import AWSTokenProvider
 from app.utils.message import TheftMessage
 from app.utils.strings import StringSerializer
 # from app.utils.json_schema import JSONSerializer
 import json
+import time
 import asyncio
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 logger = logging.getLogger("AIOKafkaProducer")
@@ -26,11 +34,53 @@ def create_ssl_context():
     return _ssl_context
 
 
+class DeliveryMetrics:
+    """Counters for fire-and-forget sends, updated from the delivery futures."""
+
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.last_error = None
+
+    @property
+    def pending(self):
+        return self.sent - self.delivered - self.failed
+
+    def on_delivery(self, sent_at, future):
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+            self.last_error = "cancelled" if future.cancelled() else str(future.exception())
+            return
+        self.delivered += 1
+        self.latency_total += time.monotonic() - sent_at
+
+    def snapshot(self):
+        return {
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "pending": self.pending,
+            "mean_latency_ms": round(1000 * self.latency_total / self.delivered, 2) if self.delivered else None,
+            "last_error": self.last_error,
+        }
+
+
 class CustomAIOKafkaProducer:
-    def __init__(self) -> None:
+    def __init__(self, high_throughput=None) -> None:
 
         logger.info("aiokafka producer instance has been created.")
 
+        if high_throughput is None:
+            high_throughput = config.KAFKA_HIGH_THROUGHPUT == "True"
+        # Let messages accumulate into large compressed batches instead of one request per message
+        batching = dict(
+            linger_ms=config.KAFKA_LINGER_MS,
+            max_batch_size=config.KAFKA_MAX_BATCH_SIZE,
+            compression_type=config.KAFKA_COMPRESSION,
+        ) if high_throughput else {}
+
         self.producer = AIOKafkaProducer(
             # bootstrap_servers=os.getenv("KAFKA_BROKER_ADDRESS", "localhost:9092"),
             bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092"),
@@ -42,12 +92,17 @@ class CustomAIOKafkaProducer:
             ssl_context=create_ssl_context(),
             sasl_mechanism="OAUTHBEARER",
             sasl_oauth_token_provider=AWSTokenProvider(),
+            **batching,
         )
 
         self.string_serializer = StringSerializer("utf-8")
+        self.metrics = DeliveryMetrics()
+        self.in_flight = set()
     
     def serializer(self, value):
-        return json.dumps(value).encode("utf-8")
+        if orjson is not None:
+            return orjson.dumps(value)
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
 
     async def produce(self, topic: str, message: TheftMessage) -> None:
 
@@ -63,9 +118,39 @@ class CustomAIOKafkaProducer:
 
         except Exception as err:
             logger.error(f"{err}")
-            self.producer.stop()
             raise
 
+    async def produce_nowait(self, topic: str, message, key=None) -> None:
+        """
+        Queue a message without waiting for the broker.
+
+        Only waits while the producer's buffer is full (backpressure); the delivery result
+        is recorded in `metrics` when it arrives.
+        """
+        sent_at = time.monotonic()
+        # Counted before the send so a failed send (counted below) can't push `pending` negative
+        self.metrics.sent += 1
+        try:
+            future = await self.producer.send(topic=topic, key=self.string_serializer(key), value=message.to_dict())
+        except Exception as err:
+            self.metrics.failed += 1
+            self.metrics.last_error = str(err)
+            raise
+        self.in_flight.add(future)
+        future.add_done_callback(self.in_flight.discard)
+        future.add_done_callback(lambda f: self.metrics.on_delivery(sent_at, f))
+
+    async def produce_batch(self, topic: str, messages) -> None:
+        """Send (key, TheftMessage) pairs together and wait until the broker has acknowledged all of them."""
+
+        futures = [
+            await self.producer.send(topic=topic, key=self.string_serializer(key), value=message.to_dict())
+            for key, message in messages
+        ]
+        await self.producer.flush()
+        for result in await asyncio.gather(*futures):
+            logger.info(result)
+
     async def start(self) -> None:
 
         logger.info("aiokafka producer is connecting to kafka broker")
@@ -74,8 +159,103 @@ class CustomAIOKafkaProducer:
 
         logger.info("aiokafka producer has connected and started.")
 
+    async def flush(self) -> None:
+
+        await self.producer.flush()
+        if self.in_flight:
+            await asyncio.wait(list(self.in_flight))
+
     async def stop(self) -> None:
 
+        try:
+            await self.flush()
+        except Exception as err:
+            logger.error(f"Error flushing pending messages: {err}")
         await self.producer.stop()
 
-        logger.info("aiokafka producer has stopped.")
+        logger.info(f"aiokafka producer has stopped. Delivery: {self.metrics.snapshot()}")
+
+
+class BackgroundKafkaPublisher:
+    """
+    Runs a high-throughput CustomAIOKafkaProducer on its own event loop thread.
+
+    Lets synchronous code (the inference loop in main.py) hand off messages with
+    `publish` without blocking on the broker. Messages are dropped, and counted, when
+    more than `max_pending` are waiting to be queued.
+    """
+
+    def __init__(self, topic, max_pending=10000):
+        self.topic = topic
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.dropped = 0
+        self.producer = None
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.connect_task = None
+        self.thread = threading.Thread(target=self._run, name="kafka-publisher", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.connect_task = self.loop.create_task(self._connect())
+        self.loop.run_forever()
+
+    async def _connect(self):
+        while True:
+            producer = None
+            try:
+                # Inside the try: construction fails too, e.g. when the compression codec's library is missing
+                producer = CustomAIOKafkaProducer(high_throughput=True)
+                await producer.start()
+                self.producer = producer
+                self.ready.set()
+                return
+            except Exception as err:
+                logger.error(f"Error connecting publisher to kafka: {err}")
+                if producer is not None:
+                    # Release the failed client's connections and background tasks before retrying
+                    try:
+                        await producer.producer.stop()
+                    except Exception:
+                        pass
+                await asyncio.sleep(5)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    async def _send(self, message, key):
+        try:
+            await self.producer.produce_nowait(self.topic, message, key=key)
+        except Exception:
+            pass  # Already counted as failed by produce_nowait
+        finally:
+            self.slots.release()
+
+    def publish(self, message, key=None):
+        if not self.ready.is_set() or not self.slots.acquire(blocking=False):
+            self.dropped += 1
+            return False
+        asyncio.run_coroutine_threadsafe(self._send(message, key), self.loop)
+        return True
+
+    def stats(self):
+        stats = self.producer.metrics.snapshot() if self.producer else {}
+        stats["dropped"] = self.dropped
+        return stats
+
+    async def _cancel_connect(self):
+        self.connect_task.cancel()
+        try:
+            await self.connect_task
+        except asyncio.CancelledError:
+            pass
+
+    def close(self, timeout=10):
+        if self.ready.is_set():
+            asyncio.run_coroutine_threadsafe(self.producer.stop(), self.loop).result(timeout=timeout)
+        elif self.connect_task is not None:
+            # Still retrying the connection: cancel it rather than stopping the loop under it
+            asyncio.run_coroutine_threadsafe(self._cancel_connect(), self.loop).result(timeout=timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
@@ -1,5 +1,6 @@
 import cv2
 import time
+import signal
 import asyncio
 import logging
 import numpy as np
@@ -10,28 +11,48 @@ from app import config
 from app.utils.common import CacheHelper
 from app.utils.preprocess import PreProcess
 from app.utils.camera_intialize import CameraInit
-from app.models.theft_inference import TheftInference
+from app.stream.capture import ThreadedCapture
+from app.utils.evidence import create_evidence_buffer
+from app.models.theft_inference import create_theft_inference
+from app.utils.message import WindowProbabilityMessage
+from app.kafka.asyncio.producer import BackgroundKafkaPublisher
 
 logger = logging.getLogger("main")
 
+
+def open_video(camera, client_type, rtsp_link):
+    if config.CAPTURE_THREADED != "True":
+        return camera.camera_init(client_type=client_type, rtsp_url=rtsp_link)
+    return ThreadedCapture(
+        lambda: camera.camera_init(client_type=client_type, rtsp_url=rtsp_link),
+        buffer_size=config.CAPTURE_BUFFER_SIZE,
+        policy=config.CAPTURE_DROP_POLICY,
+        read_timeout=config.CAPTURE_READ_TIMEOUT,
+    ).start()
+
+
 async def main() -> None:
     try:
         # Initialization
         camera = CameraInit()
         rch = CacheHelper()
-        model = TheftInference()
+        model = create_theft_inference()
         preprocess_obj = PreProcess()
+        signal.signal(signal.SIGHUP, lambda *_: preprocess_obj.roi.reload())
         
         # Initialize variables
         camera.print_values()
         client_type = config.CLIENT_TYPE
         rtsp_link = config.RTSP_URL
-        frame_count, batch_count, skip_predictions = 0, 0, 0
-        clip, frames_original = deque(maxlen=config.FRAME_LENGTH), deque(maxlen=config.FRAME_LENGTH + 200)
+        frame_count, frame_index, batch_count, skip_predictions = 0, 0, 0, 0
+        camera_id = config.RABBITMQ_CAMERAID or config.CAMERA_NO
+        clip = model.create_clip_buffer()
+        frames_original = create_evidence_buffer(camera_id)
         person_detection_history = deque(maxlen=100)
+        publisher = BackgroundKafkaPublisher(config.KAFKA_PROBABILITY_TOPIC).start() if config.KAFKA_PROBABILITY_TOPIC else None
         
         # Video initialization
-        video = camera.camera_init(client_type=client_type, rtsp_url=rtsp_link)
+        video = open_video(camera, client_type, rtsp_link)
         frame_time = time.time()
         
         while True:
@@ -42,45 +63,64 @@ async def main() -> None:
             if not success or not isinstance(frame, np.ndarray):
                 logger.warning("Error loading frame")
                 video.release()
-                video = camera.camera_init(client_type=client_type, rtsp_url=rtsp_link)
+                video = open_video(camera, client_type, rtsp_link)
                 continue
             
             frame_count += 1
+            frame_index += 1
             batch_count += 1
             
             # Log FPS
             current_time = time.time()
             if current_time - frame_time >= 1:
                 logger.info(f"Frames fetched in last second: {frame_count}")
+                if isinstance(video, ThreadedCapture):
+                    logger.info(f"Capture stats: {video.stats()}")
+                if preprocess_obj.motion_gate is not None:
+                    logger.info(f"Motion gate stats: {preprocess_obj.motion_gate.stats()}")
+                if publisher is not None:
+                    logger.info(f"Probability publisher stats: {publisher.stats()}")
                 frame_count = 0
                 frame_time = current_time
             
             # Process frame and get person count
             pre_frame, person_count = preprocess_obj.preprocess_image(frame)
-            clip.append(pre_frame)
-            frames_original.append(cv2.resize(frame, (480, 360)))
+            clip.append(model.add_frame(frame_index, pre_frame))
+            frames_original.write(cv2.resize(frame, (480, 360)))
             
             person_detection_history.append(person_count > 0)
             persons_detected = any(person_detection_history)
             
-            if len(clip) == config.FRAME_LENGTH and batch_count >= 5 and skip_predictions <= 0:
+            if len(clip) == config.FRAME_LENGTH and batch_count >= config.PREDICTION_STRIDE and skip_predictions <= 0:
                 if persons_detected:
                     frame_current_time = datetime.datetime.now(datetime.timezone.utc)
-                    skip_predictions, theft_res = model.predict(list(clip), frame_current_time)
+                    skip_predictions, theft_res = model.predict(clip.window(), frame_current_time)
                     previous_theft_prob = theft_res
+                    if publisher is not None and model.last_probability is not None:
+                        publisher.publish(WindowProbabilityMessage(
+                            camera_id=str(camera_id),
+                            timestamp=frame_current_time,
+                            theft_probability=model.last_probability,
+                            person_count=person_count,
+                        ), key=str(camera_id))
                 else:
                     logger.info("Skipping prediction - no persons detected in recent frames")
                     model.counter = 0
                 batch_count = 0
             else:
                 if skip_predictions == 199:
-                    rch.set_json({"theft_result": [15, frames_original, previous_theft_prob, frame_current_time]})
+                    alert_frames = frames_original.descriptor(config.FRAME_LENGTH + 200)
+                    rch.push_event(config.ALERT_QUEUE, [15, alert_frames, previous_theft_prob, frame_current_time])
                 skip_predictions -= 1
     
     except Exception as e:
         logger.error(f"Error in main function: {e}", exc_info=True)
         if 'video' in locals():
             video.release()
+        if 'frames_original' in locals():
+            frames_original.close()
+        if locals().get('publisher') is not None:
+            publisher.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
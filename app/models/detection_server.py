@@ -0,0 +1,38 @@
+import logging
+
+from app import config
+from app.utils.preprocess import load_yolo, detect_persons
+from app.utils.batching import DynamicBatcher, BatchServer, get_authkey
+
+logger = logging.getLogger("Detection Server")
+
+
+class DetectionServer:
+    """
+    One YOLO person detector shared by every camera pipeline on the node.
+
+    Frames from all connected cameras are batched into a single `predict` call and each
+    pipeline gets back the person boxes for its own frame.
+    """
+
+    def __init__(self, model=None, address=config.DETECTION_SERVER_ADDRESS,
+                 max_batch_size=config.DETECTION_MAX_BATCH,
+                 max_wait=config.DETECTION_MAX_WAIT_MS / 1000):
+        if not address:
+            raise ValueError("DETECTION_SERVER_ADDRESS is not set in the .env file")
+        self.model = model or load_yolo()
+        self.batcher = DynamicBatcher(self.run_batch, max_batch_size=max_batch_size,
+                                      max_wait=max_wait, name="detection-batcher")
+        self.server = BatchServer(self.batcher, address, get_authkey())
+
+    def run_batch(self, images):
+        boxes = detect_persons(self.model, images)
+        logger.debug(f"Ran batch of {len(images)}, mean batch size {self.batcher.mean_batch_size:.2f}")
+        return boxes
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+
+if __name__ == "__main__":
+    DetectionServer().serve_forever()
@@ -0,0 +1,40 @@
+import logging
+
+import numpy as np
+
+from app import config
+from app.models.theft_inference import TheftInference
+from app.utils.batching import DynamicBatcher, BatchServer, get_authkey
+
+logger = logging.getLogger("Inference Server")
+
+
+class InferenceServer:
+    """
+    One TheftInference shared by every camera pipeline on the node.
+
+    Clips from all connected cameras are batched together and pushed through a single
+    model call; each camera gets its own theft probability back.
+    """
+
+    def __init__(self, model=None, address=config.INFERENCE_SERVER_ADDRESS,
+                 max_batch_size=config.INFERENCE_MAX_BATCH,
+                 max_wait=config.INFERENCE_MAX_WAIT_MS / 1000):
+        if not address:
+            raise ValueError("INFERENCE_SERVER_ADDRESS is not set in the .env file")
+        self.model = model or TheftInference()
+        self.batcher = DynamicBatcher(self.run_batch, max_batch_size=max_batch_size,
+                                      max_wait=max_wait, name="inference-batcher")
+        self.server = BatchServer(self.batcher, address, get_authkey())
+
+    def run_batch(self, clips):
+        probabilities = self.model.infer(np.stack(clips))
+        logger.debug(f"Ran batch of {len(clips)}, mean batch size {self.batcher.mean_batch_size:.2f}")
+        return [float(p) for p in probabilities]
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+
+if __name__ == "__main__":
+    InferenceServer().serve_forever()
@@ -1,57 +1,225 @@
-import tensorflow as tf
+import numpy as np
 from loguru import logger
 from dotenv import load_dotenv
 
 from app import config
+from app.utils.batching import BatchClient, get_authkey
+from app.utils.feature_cache import FeatureCache
+from app.utils.ring_buffer import FrameRingBuffer
 
 load_dotenv()
 
-gpu_devices = tf.config.experimental.list_physical_devices('GPU')
-for gpu in gpu_devices:
-    tf.config.experimental.set_memory_growth(gpu, True)
-    tf.config.experimental.set_virtual_device_configuration(
-        gpu, [tf.config.experimental.VirtualDeviceConfiguration(config.GPU_LIMIT)]
-    )
 
-class TheftInference:
+class TensorFlowBackend:
+    """SavedModel (plain or TF-TRT) run through TensorFlow."""
+
+    gpus_configured = False
+
+    def __init__(self, model_path, threads=0):
+        import tensorflow as tf
+
+        self.tf = tf
+        if not TensorFlowBackend.gpus_configured:
+            if threads:
+                tf.config.threading.set_intra_op_parallelism_threads(threads)
+            for gpu in tf.config.experimental.list_physical_devices('GPU'):
+                tf.config.experimental.set_memory_growth(gpu, True)
+                tf.config.experimental.set_virtual_device_configuration(
+                    gpu, [tf.config.experimental.VirtualDeviceConfiguration(config.GPU_LIMIT)]
+                )
+            TensorFlowBackend.gpus_configured = True
+
+        # model = tf.keras.models.load_model(model_path)  #for raw model
+        self.model = tf.saved_model.load(model_path)
+
+    def __call__(self, batch):
+        return np.asarray(self.model(self.tf.convert_to_tensor(np.asarray(batch, dtype=np.float32))))
+
+
+class OnnxRuntimeBackend:
+    """ONNX model on the ONNX Runtime CPU execution provider with full graph optimizations."""
+
+    def __init__(self, model_path, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+class OpenVINOBackend:
+    """OpenVINO IR (or ONNX) model compiled for the CPU plugin."""
+
+    def __init__(self, model_path, threads=0):
+        import openvino as ov
+
+        properties = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            properties["INFERENCE_NUM_THREADS"] = threads
+
+        core = ov.Core()
+        self.model = core.compile_model(core.read_model(model_path), "CPU", properties)
+        self.output = self.model.output(0)
+
+    def __call__(self, batch):
+        return self.model(np.asarray(batch, dtype=np.float32))[self.output]
+
+
+BACKENDS = {
+    "tensorflow": TensorFlowBackend,
+    "onnxruntime": OnnxRuntimeBackend,
+    "openvino": OpenVINOBackend,
+}
+
+
+def load_backend(model_path, backend=None, threads=None):
+    backend = (backend or config.INFERENCE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}, expected one of {sorted(BACKENDS)}")
+    threads = config.INFERENCE_THREADS if threads is None else threads
+    logger.info(f"Loading {model_path} with the {backend} backend")
+    return BACKENDS[backend](model_path, threads=threads)
+
+
+class BaseTheftInference:
+    """Threshold / consecutive-prediction logic shared by local and remote models."""
+
     def __init__(self):
         self.threshold_prob = config.THEFT_THRESHOLD
-        self.model_path = config.MODEL_PATH
         self.skip_frame = config.SKIP_FRAME
-        
-        if not self.model_path:
-            raise ValueError("MODEL_PATH is not set in the .env file")
-        
-        self.model = self.load_model()
-        if self.model is None:
-            raise ValueError(f"Failed to load the model from {self.model_path}.")
-        
         self.counter = 0
+        self.last_probability = None
+
+    def create_clip_buffer(self):
+        """Sliding window of preprocessed uint8 frames; converted to float only inside the backend."""
+        return FrameRingBuffer(config.FRAME_LENGTH, (224, 224, 3), dtype=np.uint8)
+
+    def add_frame(self, frame_index, frame):
+        """Return what the caller should keep in its clip window for this frame."""
+        return frame
+
+    def infer(self, clips):
+        """Return the theft probability for every clip in a (batch, frames, h, w, 3) uint8 array."""
+        raise NotImplementedError
 
-    def load_model(self):
-        try:
-            # model = tf.keras.models.load_model(self.model_path)  #for raw model
-            return tf.saved_model.load(self.model_path)
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            return None
-    
     def predict(self, clip, frame_current_time):
-        clip = tf.expand_dims(tf.stack(clip), axis=0)
-        
+        clip = np.asarray(clip)[np.newaxis]
+        self.last_probability = None
+
         try:
-            prediction = self.model(clip)
-            theft_res = prediction[0][1]
+            theft_res = self.infer(clip)[0]
+            self.last_probability = float(theft_res)
             logger.info(f"Theft Predicted with confidence: {theft_res}, Time: {frame_current_time}")
-            
+
             if theft_res > self.threshold_prob:
                 self.counter += 1
                 if self.counter >= config.CONSECUTIVE_PRED:
                     self.counter = 0
-                    return self.skip_frame, float(theft_res)  
+                    return self.skip_frame, float(theft_res)
             else:
                 self.counter = 0
         except Exception as e:
             logger.error(f"Prediction error: {e}")
-        
-        return 0, 0
\ No newline at end of file
+
+        return 0, 0
+
+
+class TheftInference(BaseTheftInference):
+    def __init__(self):
+        super().__init__()
+        self.model_path = config.MODEL_PATH
+
+        if not self.model_path:
+            raise ValueError("MODEL_PATH is not set in the .env file")
+
+        self.model = self.load_model()
+        if self.model is None:
+            raise ValueError(f"Failed to load the model from {self.model_path}.")
+
+    def load_model(self):
+        try:
+            return load_backend(self.model_path)
+        except Exception as e:
+            logger.error(f"Error loading model: {e}")
+            return None
+
+    def infer(self, clips):
+        return self.model(clips)[:, 1]
+
+
+class RemoteTheftInference(BaseTheftInference):
+    """Sends clips to a shared `app.models.inference_server` instead of loading the model."""
+
+    def __init__(self, address=None):
+        super().__init__()
+        self.client = BatchClient(
+            address or config.INFERENCE_SERVER_ADDRESS,
+            authkey=get_authkey(),
+            name=config.RABBITMQ_CAMERAID or config.CAMERA_NO,
+            timeout=config.INFERENCE_TIMEOUT,
+        )
+
+    def infer(self, clips):
+        return np.array([self.client.call(clip) for clip in clips])
+
+
+class SplitTheftInference(BaseTheftInference):
+    """
+    Runs the action model as a per-frame encoder plus a temporal head.
+
+    The clip window keeps the preprocessed uint8 frames like the other modes, and nothing
+    runs until a window is actually evaluated. Then only the frames whose features aren't
+    cached yet are encoded, in one batch, so consecutive windows cost about PREDICTION_STRIDE
+    encoder frames plus one head call, and idle or gated frames cost nothing.
+    Build the two models with `python model_conversion.py --target split`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.encoder_path = config.ENCODER_MODEL_PATH
+        self.head_path = config.HEAD_MODEL_PATH
+
+        if not self.encoder_path or not self.head_path:
+            raise ValueError("ENCODER_MODEL_PATH and HEAD_MODEL_PATH must both be set in the .env file")
+
+        self.encoder = load_backend(self.encoder_path)
+        self.head = load_backend(self.head_path)
+        self.cache = FeatureCache(capacity=2 * config.FRAME_LENGTH)
+        # Frame index of every frame in the clip window, appended in step with it
+        self.indices = FrameRingBuffer(config.FRAME_LENGTH, (), dtype=np.int64)
+
+    def add_frame(self, frame_index, frame):
+        self.indices.append(frame_index)
+        return frame
+
+    def infer(self, clips):
+        if len(clips) != 1:
+            raise ValueError("Split mode evaluates the current window of one camera at a time")
+        clip = clips[0]
+        indices = self.indices.window(len(clip))
+        missing = [position for position, index in enumerate(indices) if index not in self.cache]
+        if missing:
+            for index, feature in zip(indices[missing], self.encoder(clip[missing])):
+                self.cache.put(index, feature)
+        features = self.cache.get(indices)
+        return self.head(features[np.newaxis])[:, 1]
+
+
+def create_theft_inference():
+    if config.ENCODER_MODEL_PATH or config.HEAD_MODEL_PATH:
+        logger.info("Using split encoder/head model with per-frame feature cache")
+        return SplitTheftInference()
+    if config.INFERENCE_SERVER_ADDRESS:
+        logger.info(f"Using shared inference server at {config.INFERENCE_SERVER_ADDRESS}")
+        return RemoteTheftInference()
+    return TheftInference()
@@ -0,0 +1,121 @@
+import time
+import logging
+import threading
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger("Capture")
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+KEEP_LATEST = "keep-latest"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, KEEP_LATEST)
+
+
+class ThreadedCapture:
+    """
+    Reads frames from any `read()`/`release()` video source on a background thread.
+
+    Frames land in a bounded buffer so a slow consumer never stalls capture:
+      - drop-oldest: discard the oldest buffered frame to make room (bounded lag)
+      - drop-newest: discard the incoming frame while the buffer is full (no gaps in what is kept)
+      - keep-latest: buffer of one, always the freshest frame (lowest latency)
+
+    `open_camera` is called to (re)create the source whenever it stops delivering frames.
+    """
+
+    def __init__(self, open_camera, buffer_size=2, policy=KEEP_LATEST, read_timeout=10.0, reconnect_delay=1.0):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown capture drop policy {policy!r}, expected one of {DROP_POLICIES}")
+        self.open_camera = open_camera
+        self.policy = policy
+        self.buffer_size = 1 if policy == KEEP_LATEST else max(1, buffer_size)
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self.video = None
+
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _reopen(self):
+        if self.video:
+            try:
+                self.video.release()
+            except Exception as e:
+                logger.warning(f"Error releasing video source: {e}")
+        self.video = None
+        while not self.stop_event.is_set():
+            try:
+                self.video = self.open_camera()
+                if self.video:
+                    self.reconnects += 1
+                    return
+            except Exception as e:
+                logger.error(f"Error opening video source: {e}")
+            time.sleep(self.reconnect_delay)
+
+    def _put(self, frame):
+        with self.condition:
+            if len(self.buffer) >= self.buffer_size:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    return
+                self.buffer.popleft()
+            self.buffer.append(frame)
+            self.condition.notify()
+
+    def _run(self):
+        self._reopen()
+        while not self.stop_event.is_set():
+            try:
+                success, frame = self.video.read()
+            except Exception as e:
+                logger.error(f"Error reading frame: {e}")
+                success, frame = False, None
+
+            # A failed read that still returns a frame (FrameProcessor's "no chunk yet") is not a dead source
+            if (not success or isinstance(success, str)) and isinstance(frame, np.ndarray):
+                time.sleep(0.005)
+                continue
+            if not success or not isinstance(frame, np.ndarray):
+                logger.warning("Error loading frame, reconnecting video source")
+                self._reopen()
+                continue
+
+            self.captured += 1
+            self._put(frame)
+
+    def read(self):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.buffer, timeout=self.read_timeout):
+                return False, None
+            self.delivered += 1
+            return True, self.buffer.popleft()
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "buffered": len(self.buffer),
+            "reconnects": max(0, self.reconnects - 1),
+        }
+
+    def release(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=5)
+        if self.video:
+            self.video.release()
@@ -0,0 +1,98 @@
+import os
+import csv
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from app import config
+
+logger = logging.getLogger("ChunkIndex")
+
+
+class ChunkIndex:
+    """
+    SQLite index of received chunks, shared by ChunkReceiver (writer) and FrameProcessor
+    (reader) across processes.
+
+    Replaces chunk_timestamps.csv: looking a chunk up is a primary-key read instead of a
+    scan of everything received since start-up, and rows for processed chunks are dropped
+    by `compact` once they are older than the retention window.
+    """
+
+    def __init__(self, path=None, retention=None):
+        self.path = path or config.CHUNK_INDEX_PATH
+        self.retention = config.CHUNK_INDEX_RETENTION_HOURS * 3600 if retention is None else retention
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_name TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                s3_url TEXT,
+                folder_path TEXT,
+                created_at REAL NOT NULL,
+                processed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_processed ON chunks (processed_at);
+        """)
+
+    def add(self, chunk_name, timestamp, s3_url=None, folder_path=None):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO chunks (chunk_name, timestamp, s3_url, folder_path, created_at) VALUES (?, ?, ?, ?, ?)",
+                (chunk_name, timestamp.isoformat(), s3_url or '', folder_path or '', time.time()),
+            )
+
+    def set_upload(self, chunk_name, s3_url, folder_path):
+        """Record where a chunk was uploaded, once the upload has actually succeeded."""
+        with self.lock:
+            self.db.execute("UPDATE chunks SET s3_url = ?, folder_path = ? WHERE chunk_name = ?",
+                            (s3_url, folder_path, chunk_name))
+
+    def timestamp(self, chunk_name):
+        with self.lock:
+            row = self.db.execute("SELECT timestamp FROM chunks WHERE chunk_name = ?", (chunk_name,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def mark_processed(self, chunk_name):
+        with self.lock:
+            self.db.execute("UPDATE chunks SET processed_at = ? WHERE chunk_name = ?", (time.time(), chunk_name))
+
+    def compact(self):
+        """Forget processed chunks older than the retention window; returns how many rows were dropped."""
+        with self.lock:
+            cursor = self.db.execute(
+                "DELETE FROM chunks WHERE processed_at IS NOT NULL AND processed_at < ?",
+                (time.time() - self.retention,),
+            )
+        if cursor.rowcount:
+            logger.info(f"Compacted {cursor.rowcount} processed chunks from the index")
+        return cursor.rowcount
+
+    def import_csv(self, csv_file):
+        """One-off migration of a legacy chunk_timestamps.csv into the index."""
+        if not os.path.exists(csv_file):
+            return 0
+        rows = []
+        with open(csv_file, 'r') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # Skip header
+            for row in reader:
+                if len(row) >= 2:
+                    rows.append((row[0], datetime.fromisoformat(row[1]).isoformat(),
+                                 row[2] if len(row) > 2 else '', row[3] if len(row) > 3 else '', time.time()))
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO chunks (chunk_name, timestamp, s3_url, folder_path, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        logger.info(f"Imported {len(rows)} chunks from {csv_file}")
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
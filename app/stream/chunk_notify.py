@@ -0,0 +1,105 @@
+import os
+import heapq
+import socket
+import logging
+
+from app import config
+
+logger = logging.getLogger("ChunkNotify")
+
+
+def socket_path(chunk_dir, path=None):
+    """The notification socket lives next to the chunks, so both sides always agree on it."""
+    return path or config.CHUNK_NOTIFY_SOCKET or os.path.join(chunk_dir, ".chunks.sock")
+
+
+class ChunkNotifier:
+    """
+    ChunkReceiver side of the chunk-arrival channel: one UNIX datagram with the chunk
+    number per finished chunk. Best effort, if FrameProcessor isn't listening the chunk is
+    picked up by its directory scan on start-up instead.
+    """
+
+    def __init__(self, chunk_dir, path=None):
+        self.path = socket_path(chunk_dir, path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def notify(self, chunk_number):
+        try:
+            self.sock.sendto(str(chunk_number).encode(), self.path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            # Nobody is bound to the socket: FrameProcessor is down or uses a different path
+            logger.warning(f"Chunk {chunk_number} notification not delivered to {self.path}: {e}")
+        except BlockingIOError as e:
+            logger.debug(f"Chunk {chunk_number} notification not delivered: {e}")
+
+    def close(self):
+        self.sock.close()
+
+
+class ChunkListener:
+    """
+    FrameProcessor side: receives chunk numbers and hands them out lowest first.
+
+    `next_chunk` blocks up to `timeout` seconds for a notification instead of polling the
+    directory. The directory is only listed once at start-up (chunks that arrived while
+    nobody was listening) and again after an idle timeout, in case a datagram was lost.
+    """
+
+    def __init__(self, chunk_dir, path=None):
+        self.chunk_dir = chunk_dir
+        self.path = socket_path(chunk_dir, path)
+        self.pending = []
+        self.queued = set()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.path)
+        self.rescan()
+
+    def _push(self, chunk_number):
+        if chunk_number not in self.queued:
+            self.queued.add(chunk_number)
+            heapq.heappush(self.pending, chunk_number)
+
+    def rescan(self):
+        for name in os.listdir(self.chunk_dir):
+            stem, ext = os.path.splitext(name)
+            if ext == '.ts' and stem.isdigit():
+                self._push(int(stem))
+
+    def _receive(self, timeout):
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(64)
+        except socket.timeout:
+            return False
+        self._push(int(data))
+        # Collect anything else that is already waiting without blocking
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self._push(int(self.sock.recv(64)))
+        except BlockingIOError:
+            pass
+        return True
+
+    def next_chunk(self, timeout=1.0):
+        """Lowest pending chunk number, or None if nothing arrived within `timeout`."""
+        if not self.pending and not self._receive(timeout):
+            self.rescan()
+        if not self.pending:
+            return None
+        chunk_number = heapq.heappop(self.pending)
+        self.queued.discard(chunk_number)
+        return chunk_number
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,10 +1,18 @@
 import os
 import cv2
+import subprocess
 import numpy as np
 import logging
-from collections import deque
-import csv
-from datetime import datetime
+from collections import deque, Counter
+
+try:
+    import av
+except ImportError:
+    av = None
+
+from app import config
+from app.stream.chunk_index import ChunkIndex
+from app.stream.chunk_notify import ChunkListener
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,50 +26,142 @@ class FrameProcessor:
         self.temp_dir = "temp_dir"
         self.target_total_frames = target_total_frames
         self.current_time = None
-        self.csv_file = "chunk_timestamps.csv"
+        self.index = ChunkIndex()
         
-        # Define a special frame to indicate no frames available
-        self.NO_FRAMES_SIGNAL = "skip"
+        # Define a special frame to indicate no frames available; with a falsy signal callers
+        # treat it as "nothing yet" rather than as a frame
+        self.NO_FRAMES_SIGNAL = False
         self.dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
         
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
             self.logger.info(f"Created directory: {self.temp_dir}")
+        
+        # ChunkReceiver announces every finished chunk, so we block on that instead of listing the directory
+        self.listener = ChunkListener(self.temp_dir)
+        self.wait_timeout = config.CHUNK_WAIT_TIMEOUT
+        # Chunk frames end up at 640x480 in preprocessing anyway, so convert straight to that size
+        self.decode_size = tuple(int(v) for v in config.CHUNK_DECODE_SIZE.split('x')) if config.CHUNK_DECODE_SIZE else None
 
     def _get_chunk_timestamp(self, chunk_name):
         """
-        Get timestamp for a specific chunk from CSV file.
+        Get timestamp for a specific chunk from the chunk index.
         """
         try:
-            with open(self.csv_file, 'r') as f:
-                reader = csv.reader(f)
-                next(reader)  # Skip header
-                for row in reader:
-                    if row[0] == chunk_name:
-                        return datetime.fromisoformat(row[1])
-            return None
+            return self.index.timestamp(chunk_name)
         except Exception as e:
-            self.logger.error(f"Error reading timestamp from CSV: {e}")
+            self.logger.error(f"Error reading timestamp from chunk index: {e}")
+            return None
+
+    def select_indices(self, frame_count):
+        """How often each frame index is sampled when a chunk of frame_count frames is scaled to target_total_frames."""
+        if frame_count <= self.target_total_frames:
+            return Counter(range(frame_count))
+        indices = np.linspace(0, frame_count - 1, self.target_total_frames)
+        return Counter(int(round(i)) for i in indices)
+
+    def _resize(self, frame):
+        if self.decode_size and (frame.shape[1], frame.shape[0]) != self.decode_size:
+            return cv2.resize(frame, self.decode_size)
+        return frame
+
+    def sample(self, frames, frame_count, convert):
+        """
+        Yield the sampled frames of a decoded stream, converting only those. If the stream
+        ends before `frame_count` frames (the count was off), the last sampled frame is
+        repeated so the chunk still yields as many frames as planned.
+        """
+        selected = self.select_indices(frame_count)
+        expected, produced, image = sum(selected.values()), 0, None
+        for index, frame in enumerate(frames):
+            repeat = selected.get(index)
+            if repeat:
+                converted = convert(frame)
+                if converted is None:
+                    continue
+                image = converted
+                for _ in range(repeat):
+                    yield image
+                produced += repeat
+        if image is not None and produced < expected:
+            self.logger.debug(f"Chunk decoded short of {frame_count} frames, padding {expected - produced}")
+            for _ in range(expected - produced):
+                yield image
+
+    @staticmethod
+    def _count_from_keyframe(keyframe_flags):
+        """Frames the decoder will output: packets from the first keyframe on (earlier ones can't be decoded)."""
+        count, started = 0, False
+        for is_keyframe in keyframe_flags:
+            started = started or is_keyframe
+            count += started
+        return count
+
+    def _count_frames_av(self, file_path):
+        with av.open(file_path) as container:
+            return self._count_from_keyframe(packet.is_keyframe for packet in container.demux(video=0) if packet.size)
+
+    def _count_frames_ffprobe(self, file_path):
+        """Packet count from ffprobe (demuxing only, nothing is decoded); None if ffprobe can't be run."""
+        command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                   '-show_entries', 'packet=flags', '-of', 'csv=p=0', file_path]
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=10, check=True)
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.debug(f"ffprobe could not count packets of {file_path}: {e}")
             return None
+        return self._count_from_keyframe('K' in line for line in result.stdout.splitlines() if line.strip())
 
-    def scale_frames(self, frames):
+    def _decode_av(self, file_path):
+        """
+        Stream a chunk with PyAV. Packets are counted first (demuxing only) to place the
+        sampling points; every frame still goes through the decoder, but only the sampled
+        ones are converted to BGR arrays, already scaled to decode_size.
         """
-        Scale the number of frames to match target_total_frames.
-        Args:
-            frames: List of frames to scale
-        Returns:
-            scaled_frames: List of frames scaled to target_total_frames
+        frame_count = self._count_frames_av(file_path)
+        width, height = self.decode_size or (None, None)
+        with av.open(file_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            yield from self.sample(container.decode(stream), frame_count,
+                                   lambda frame: frame.to_ndarray(format='bgr24', width=width, height=height))
+
+    def _retrieve(self, cap):
+        ret, frame = cap.retrieve()
+        return self._resize(frame) if ret else None
+
+    def _decode_cv2(self, file_path):
         """
-        target_frame_count = self.target_total_frames
-        current_frame_count = len(frames)
+        OpenCV fallback, decoding the chunk once. grab() decodes every frame, so the sampling
+        points come from ffprobe's packet count and only the sampled frames are retrieved.
+        Without ffprobe every frame is read and the sample taken afterwards.
+        """
+        frame_count = self._count_frames_ffprobe(file_path)
+        cap = cv2.VideoCapture(file_path)
+        try:
+            if frame_count is None:
+                frames = []
+                while cap.isOpened():
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                yield from self.sample(frames, len(frames), self._resize)
+                return
 
-        if current_frame_count > target_frame_count:
-            indices = np.linspace(0, current_frame_count - 1, target_frame_count)
-            scaled_frames = [frames[int(round(i))] for i in indices]
-        else:
-            scaled_frames = frames
+            def grabbed():
+                while cap.grab():
+                    yield cap
 
-        return scaled_frames
+            yield from self.sample(grabbed(), frame_count, self._retrieve)
+        finally:
+            cap.release()
+
+    def decode_chunk(self, file_path):
+        """Lazily yield the sampled frames of a chunk, in order."""
+        if av is not None:
+            return self._decode_av(file_path)
+        return self._decode_cv2(file_path)
 
     def read(self):
         """
@@ -70,42 +170,32 @@ class FrameProcessor:
         """
         try:
             if len(self.frame_queue) == 0:
-                ts_files = [f for f in os.listdir(self.temp_dir) if f.endswith('.ts')]
-                if not ts_files:
+                lowest_number = self.listener.next_chunk(timeout=self.wait_timeout)
+                if lowest_number is None:
                     self.logger.debug("No TS files available")
                     return self.NO_FRAMES_SIGNAL, self.dummy_frame
-                
-                # Sort by actual chunk number
-                ts_files_sorted = sorted(ts_files, key=lambda x: int(x.split('.')[0]))
-                lowest_file = ts_files_sorted[0]
-                lowest_number = int(lowest_file.split('.')[0])
+                lowest_file = f"{lowest_number}.ts"
+                if not os.path.exists(os.path.join(self.temp_dir, lowest_file)):
+                    self.logger.warning(f"Announced chunk {lowest_file} is missing")
+                    return self.NO_FRAMES_SIGNAL, self.dummy_frame
                 
                 self.logger.info(f"Processing chunk ::::  {lowest_number}")
                 
-                # Update current_time from CSV
+                # Update current_time from the chunk index
                 self.current_time = self._get_chunk_timestamp(lowest_file)
                 
                 file_path = os.path.join(self.temp_dir, lowest_file)
-                cap = cv2.VideoCapture(file_path)
-                frames = []
+                try:
+                    # Only the sampled frames are ever held in memory
+                    self.frame_queue.extend(self.decode_chunk(file_path))
+                finally:
+                    os.remove(file_path)  # Remove processed chunk
+                    self.index.mark_processed(lowest_file)
                 
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    frames.append(frame)
-                
-                cap.release()
-                os.remove(file_path)  # Remove processed chunk
-                
-                if not frames:
+                if not self.frame_queue:
                     self.logger.warning(f"No frames could be read from {lowest_file}")
                     return self.NO_FRAMES_SIGNAL, self.dummy_frame
                 
-                # Scale frames and add to queue
-                scaled_frames = self.scale_frames(frames)
-                self.frame_queue.extend(scaled_frames)
-                
                 return True, self.frame_queue.popleft()
             else:
                 return True, self.frame_queue.popleft()
@@ -113,6 +203,9 @@ class FrameProcessor:
         except Exception as e:
             self.logger.error(f"Error in processing ts file: {e}")
             return self.NO_FRAMES_SIGNAL, self.dummy_frame
+    
+    def release(self):
+        self.listener.close()
 
 
 
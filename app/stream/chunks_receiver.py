@@ -3,11 +3,13 @@ import websocket
 import logging
 from threading import Event
 import time
-import csv
 import datetime
 from datetime import timezone
-import boto3
-from botocore.exceptions import ClientError
+
+from app.stream import wire
+from app.stream.chunk_index import ChunkIndex
+from app.stream.chunk_notify import ChunkNotifier
+from app.utils.storage import S3Storage, Uploader
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,15 +24,18 @@ class ChunkReceiver:
         self.temp_dir = "temp_dir"
         self.stop_event = Event()
         self.csv_file = "chunk_timestamps.csv"
+        self.index = ChunkIndex()
+        self.notifier = ChunkNotifier(self.temp_dir)
+        self.compact_every = 100
         
         # AWS S3 configuration
         self.bucket_name = bucket_name
-        self.s3_client = boto3.client(
-            's3',
+        self.uploader = Uploader(S3Storage(
+            bucket=bucket_name,
+            region=aws_region,
             aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name=aws_region
-        )
+            aws_secret_access_key=aws_secret_access_key
+        ))
         
         # Create temp directory if it doesn't exist
         if not os.path.exists(self.temp_dir):
@@ -39,12 +44,10 @@ class ChunkReceiver:
         else:
             self.logger.info(f"Using existing directory: {self.temp_dir}")
         
-        # Initialize CSV file with headers if it doesn't exist
-        if not os.path.exists(self.csv_file):
-            with open(self.csv_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['chunk_name', 'timestamp', 's3_url', 'folder_path'])
-            self.logger.info(f"Created CSV file: {self.csv_file}")
+        # Carry over timestamps from the CSV log used before the chunk index
+        if os.path.exists(self.csv_file):
+            self.index.import_csv(self.csv_file)
+            os.replace(self.csv_file, f"{self.csv_file}.imported")
             
         self.highest_chunk_number = self._get_current_highest_chunk()
         self.logger.info(f"Starting with highest chunk number: {self.highest_chunk_number}")
@@ -59,25 +62,31 @@ class ChunkReceiver:
         date_folder = self._get_date_folder()
         return f"chunks/{date_folder}/{os.getenv('RABBITMQ_CAMERAID')}/{chunk_name}"
 
-    def _upload_to_s3(self, file_path, chunk_name):
-        """Upload a file to S3 bucket in date-based folder structure and return the URL."""
+    def _upload_to_s3(self, data, chunk_name):
+        """
+        Queue the chunk bytes for background upload in date-based folder structure. Uploading
+        from memory means FrameProcessor can delete the local file while the upload is still
+        running. The URL is only written to the chunk index once the upload succeeded.
+        """
+        s3_path = self._get_s3_path(chunk_name)
+        future = self.uploader.submit_bytes(data, s3_path)
+        future.add_done_callback(lambda f: self._log_upload(f, chunk_name, s3_path))
+
+    def _log_upload(self, future, chunk_name, s3_path):
+        if future.exception() is not None:
+            self.logger.error(f"Error uploading to S3: {future.exception()}")
+            return
+        self.logger.info(f"Successfully uploaded {s3_path} to S3")
         try:
-            s3_path = self._get_s3_path(chunk_name)
-            self.s3_client.upload_file(file_path, self.bucket_name, s3_path)
-            url = f"https://{self.bucket_name}.s3.amazonaws.com/{s3_path}"
-            self.logger.info(f"Successfully uploaded {s3_path} to S3")
-            return url, s3_path
-        except ClientError as e:
-            self.logger.error(f"Error uploading to S3: {e}")
-            return None, None
-
-    def _save_timestamp(self, chunk_name, s3_url=None, folder_path=None):
-        """Save chunk name, timestamp, S3 URL, and folder path to CSV file."""
+            self.index.set_upload(chunk_name, future.result(), s3_path)
+        except Exception as e:
+            self.logger.error(f"Error saving S3 URL for {chunk_name}: {e}")
+
+    def _save_timestamp(self, chunk_name, s3_url=None, folder_path=None, timestamp=None):
+        """Save chunk name, timestamp, S3 URL, and folder path to the chunk index."""
         try:
-            timestamp = datetime.datetime.now(timezone.utc)
-            with open(self.csv_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([chunk_name, timestamp, s3_url or '', folder_path or ''])
+            timestamp = timestamp or datetime.datetime.now(timezone.utc)
+            self.index.add(chunk_name, timestamp, s3_url, folder_path)
         except Exception as e:
             self.logger.error(f"Error saving timestamp: {e}")
 
@@ -107,6 +116,14 @@ class ChunkReceiver:
                     try:
                         data = conn.recv()
                         if isinstance(data, bytes):
+                            # Chunks may come wrapped in the binary wire envelope, which carries
+                            # the camera's own capture time instead of our receive time
+                            captured_at = None
+                            if wire.is_binary(data):
+                                header, body = wire.unpack(data)
+                                captured_at = datetime.datetime.fromtimestamp(header.timestamp, timezone.utc)
+                                data = bytes(body)
+                            
                             # Check if date has changed
                             new_date = datetime.datetime.now().date()
                             if current_date != new_date:
@@ -121,15 +138,17 @@ class ChunkReceiver:
                             with open(temp_path, 'wb') as f:
                                 f.write(data)
                             
-                            # # Upload to S3 with date-based folder structure
-                            s3_url, folder_path = self._upload_to_s3(temp_path, chunk_name)
-                            # s3_url, folder_path = "-","-"
+                            # Save timestamp; the S3 URL is filled in once the upload succeeds
+                            self._save_timestamp(chunk_name, timestamp=captured_at)
                             
-                            # Save timestamp and S3 URL
-                            self._save_timestamp(chunk_name, s3_url, folder_path)
+                            # # Upload to S3 with date-based folder structure
+                            self._upload_to_s3(data, chunk_name)
+                            self.notifier.notify(chunk_index)
                             
                             self.highest_chunk_number = chunk_index
                             chunk_index += 1
+                            if chunk_index % self.compact_every == 0:
+                                self.index.compact()
                         else:
                             self.logger.error("Received non-binary data")
                     except websocket.WebSocketConnectionClosedException:
@@ -147,6 +166,7 @@ class ChunkReceiver:
     def stop(self):
         """Stop receiving chunks."""
         self.stop_event.set()
+        self.uploader.shutdown(wait=True)
 
 def main():
     time.sleep(20)  # Initial delay
@@ -0,0 +1,49 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OrderedDecoder:
+    """
+    Runs `decode(body)` for a stream of messages on a thread pool and hands the results
+    back in submission order.
+
+    cv2.imdecode / cv2.resize release the GIL, so several frames decode in parallel while
+    the caller keeps talking to the broker. `depth` bounds how many frames are in flight.
+    With `workers=0` decoding happens inline on submit.
+    """
+
+    def __init__(self, decode, workers=2, depth=None):
+        self.decode = decode
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-decode") if workers > 0 else None
+        self.depth = depth or max(1, workers * 2)
+        self.pending = deque()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def full(self):
+        return len(self.pending) >= self.depth
+
+    def submit(self, tag, body):
+        if self.executor is None:
+            self.pending.append((tag, self.decode(body)))
+        else:
+            self.pending.append((tag, self.executor.submit(self.decode, body)))
+
+    def get(self):
+        """(tag, result) of the oldest message, waiting for its decode to finish."""
+        tag, result = self.pending.popleft()
+        if self.executor is not None:
+            result = result.result()
+        return tag, result
+
+    def clear(self):
+        for _, result in self.pending:
+            if self.executor is not None:
+                result.cancel()
+        self.pending.clear()
+
+    def shutdown(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
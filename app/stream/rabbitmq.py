@@ -131,8 +131,92 @@ import base64
 import numpy as np
 import os
 import logging
+import queue
+import threading
 import traceback
+from collections import deque
+from functools import partial
 from typing import Tuple, Optional
+
+from app import config
+from app.stream import wire
+from app.stream.decode import OrderedDecoder
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def imread_flag(reduction, width=0, height=0):
+    """
+    cv2.imdecode flag for JPEG DCT-domain downscaling. "auto" picks the largest factor that
+    still leaves at least 640x480, which needs the size from a wire header.
+    """
+    if reduction == "auto":
+        if not (width and height):
+            return cv2.IMREAD_COLOR
+        for factor in (8, 4, 2):
+            if width // factor >= 640 and height // factor >= 480:
+                return REDUCED_DECODE_FLAGS[factor]
+        return cv2.IMREAD_COLOR
+    return REDUCED_DECODE_FLAGS.get(int(reduction), cv2.IMREAD_COLOR)
+
+
+def decode_frame(body, camera_id=None, reduction=1) -> Optional[np.ndarray]:
+    """
+    Decode a frame message, either a binary wire envelope or legacy JSON with a base64
+    payload; with `camera_id`, frames for other cameras are skipped (None).
+    """
+    try:
+        if wire.is_binary(body):
+            # The camera id sits in the header, so foreign frames are skipped before any decoding
+            header, payload = wire.unpack(body)
+            if camera_id is not None and header.camera_id != camera_id:
+                logging.debug(f"Message didn't match camera {camera_id}")
+                return None
+            if header.codec == wire.CODEC_JPEG:
+                frame = cv2.imdecode(np.frombuffer(payload, np.uint8), imread_flag(reduction, header.width, header.height))
+            else:
+                frame = wire.decode_image(header, payload)
+        else:
+            message = json.loads(body)
+            if camera_id is not None and message.get('camera_id') != camera_id:
+                logging.debug(f"Message didn't match camera {camera_id}")
+                return None
+            image_data = base64.b64decode(message['payload'])
+            frame = cv2.imdecode(np.frombuffer(image_data, np.uint8), imread_flag(reduction))
+        if frame is not None:
+            if frame.shape[:2] != (480, 640):
+                frame = cv2.resize(frame, (640, 480))
+            return frame
+        else:
+            logging.error("Failed to decode image data")
+            return None
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON: {e}")
+    except KeyError as e:
+        logging.error(f"Missing key in message: {e}")
+    except Exception as e:
+        logging.error(f"Error processing message: {e}")
+    return None
+
+
+def declare_camera_queue(channel, exchange, exchange_type, camera_id):
+    """
+    Declare `exchange` and this camera's own queue bound to it by the camera's routing key;
+    returns the queue name. The queue is never shared, since its consumers skip the camera check.
+    """
+    channel.exchange_declare(exchange=exchange, exchange_type=exchange_type, durable=True)
+    queue_name = f"{exchange}.{camera_id}"
+    channel.queue_declare(queue=queue_name, durable=True, arguments={'x-queue-mode': 'lazy'})
+    channel.queue_bind(queue=queue_name, exchange=exchange,
+                       routing_key=config.RABBITMQ_ROUTING_KEY.format(camera_id=camera_id))
+    return queue_name
+
+
 class RabbitMQ:
     # def __init__(self,
     #              host="172.20.48.178",
@@ -150,6 +234,12 @@ class RabbitMQ:
                  queue_name=os.getenv("QUEUE_NAME",None),
                  buffer_size=1,
                  camera_id = os.getenv("RABBITMQ_CAMERAID",None),
+                 consumer_mode = config.RABBITMQ_CONSUMER_MODE,
+                 prefetch = config.RABBITMQ_PREFETCH,
+                 exchange = config.RABBITMQ_EXCHANGE,
+                 exchange_type = config.RABBITMQ_EXCHANGE_TYPE,
+                 decode_workers = config.FRAME_DECODE_WORKERS,
+                 decode_reduction = config.FRAME_DECODE_REDUCTION,
                  ):
         self.host = host
         self.port = port
@@ -157,8 +247,23 @@ class RabbitMQ:
         self.password = password
         self.queue_name = queue_name
         self.camera_id = camera_id
+        # With an exchange the broker routes only this camera's frames to our queue,
+        # so messages no longer need to be decoded just to check their camera id
+        self.exchange = exchange
+        self.exchange_type = exchange_type
         self.connection = None
         self.channel = None
+        # Push mode: the broker streams up to `prefetch` unacked messages into `buffer`,
+        # which are acknowledged in bulk once processed
+        self.consumer_mode = consumer_mode
+        self.prefetch = prefetch
+        self.ack_every = max(1, prefetch // 2)
+        self.buffer = deque()
+        self.last_tag = None
+        self.unacked = 0
+        # Frames are decoded on a thread pool while this thread keeps pulling from the broker
+        self.decode_reduction = decode_reduction
+        self.decoder = OrderedDecoder(self.process_message, workers=decode_workers)
         # print(camera_id,"------------------------------------")
         # print("iiiinnnnn ttthhheeee ccccliiieennnttt tttyyyyppppeeeee")
     def connect(self):
@@ -173,12 +278,23 @@ class RabbitMQ:
             )
             self.connection = pika.BlockingConnection(parameters)
             self.channel = self.connection.channel()
-            # Declare the queue without lazy mode
-            self.channel.queue_declare(
-                queue=self.queue_name,
-                durable=True,
-                arguments={'x-queue-mode': 'lazy'}
-            )
+            if self.exchange:
+                self.queue_name = declare_camera_queue(self.channel, self.exchange, self.exchange_type,
+                                                       self.camera_id)
+            else:
+                # Declare the queue without lazy mode
+                self.channel.queue_declare(
+                    queue=self.queue_name,
+                    durable=True,
+                    arguments={'x-queue-mode': 'lazy'}
+                )
+            if self.consumer_mode == "push":
+                self.decoder.clear()
+                self.buffer.clear()
+                self.last_tag = None
+                self.unacked = 0
+                self.channel.basic_qos(prefetch_count=self.prefetch)
+                self.channel.basic_consume(queue=self.queue_name, on_message_callback=self._on_message, auto_ack=False)
             print("-----------------------conected------to------------rabbitMQ-------------------------- inside-------------")
             logging.info(f"Connected to RabbitMQ on {self.host}")
         except Exception as e:
@@ -194,7 +310,54 @@ class RabbitMQ:
         self.close()
         time.sleep(5)
         self.connect()
+    def _on_message(self, channel, method, properties, body):
+        self.buffer.append((method.delivery_tag, body))
+    def _ack_processed(self):
+        if self.unacked:
+            self.channel.basic_ack(delivery_tag=self.last_tag, multiple=True)
+            self.unacked = 0
     def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.consumer_mode == "push":
+            return self._read_push()
+        return self._read_poll()
+    def _read_push(self) -> Tuple[bool, Optional[np.ndarray]]:
+        while True:
+            try:
+                if self.connection is None or self.connection.is_closed:
+                    logging.info("Connection closed, reconnecting...")
+                    self.reconnect()
+                # Keep the decode pool fed with the next deliveries, in order
+                while not self.decoder.full():
+                    if not self.buffer:
+                        if len(self.decoder):
+                            # Frames are in flight, just pick up whatever the broker already sent
+                            self.connection.process_data_events(time_limit=0)
+                            if not self.buffer:
+                                break
+                        else:
+                            # Nothing left locally: settle what we've processed, then wait for the broker
+                            self._ack_processed()
+                            self.connection.process_data_events(time_limit=1)
+                            continue
+                    self.decoder.submit(*self.buffer.popleft())
+                if not len(self.decoder):
+                    continue
+                delivery_tag, frame = self.decoder.get()
+                # Frames for other cameras are acknowledged too, as in polling mode
+                self.last_tag = delivery_tag
+                self.unacked += 1
+                if self.unacked >= self.ack_every:
+                    self._ack_processed()
+                if frame is not None:
+                    return True, frame
+            except pika.exceptions.AMQPConnectionError as e:
+                logging.error(f"AMQP Connection Error: {e}")
+                self.reconnect()
+            except Exception as e:
+                logging.error(f"Error reading message for camera {self.camera_id}: {str(e)}")
+                logging.error(f"Traceback: {traceback.format_exc()}")
+                time.sleep(1)
+    def _read_poll(self) -> Tuple[bool, Optional[np.ndarray]]:
         while True:
             try:
                 if self.connection is None or self.connection.is_closed:
@@ -222,24 +385,181 @@ class RabbitMQ:
                 logging.error(f"Traceback: {traceback.format_exc()}")
                 time.sleep(1)
     def process_message(self, body) -> Optional[np.ndarray]:
-        try:
-            message = json.loads(body)
-            if message.get('camera_id') == self.camera_id:
-                image_data = base64.b64decode(message['payload'])
-                frame = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
-                if frame is not None:
-                    frame = cv2.resize(frame, (640, 480))
-                    return frame
-                else:
-                    logging.error("Failed to decode image data")
-                    return None
-            else:
-                logging.debug(f"Message didn't match camera {self.camera_id}")
-                return None
-        except json.JSONDecodeError as e:
-            logging.error(f"Error decoding JSON: {e}")
-        except KeyError as e:
-            logging.error(f"Missing key in message: {e}")
-        except Exception as e:
-            logging.error(f"Error processing message: {e}")
-        return None
+        return decode_frame(body, None if self.exchange else self.camera_id, self.decode_reduction)
+
+
+class DemuxCamera:
+    """Per-camera view of a RabbitMQDemux with the read()/release() interface main.py expects."""
+
+    def __init__(self, demux, camera_id):
+        self.demux = demux
+        self.camera_id = camera_id
+        self.frames = demux.queues[camera_id]
+
+    def read(self, timeout=config.CAPTURE_READ_TIMEOUT) -> Tuple[bool, Optional[np.ndarray]]:
+        while True:
+            try:
+                body = self.frames.get(timeout=timeout)
+            except queue.Empty:
+                return False, None
+            # Decoded on the reader's thread, only for this camera's own frames
+            frame = decode_frame(body, reduction=config.FRAME_DECODE_REDUCTION)
+            if frame is not None:
+                return True, frame
+
+    def release(self):
+        pass
+
+
+class RabbitMQDemux:
+    """
+    Serves several cameras from one connection.
+
+    Each camera gets its own queue bound to the exchange by its routing key, and one
+    consumer thread fans deliveries out into bounded per-camera buffers. Messages are
+    acknowledged in bulk once buffered; when a camera's reader falls behind its oldest
+    buffered frame is dropped, so every pipeline keeps seeing live frames.
+
+    A camera's queue is only consumed once `camera()` has been called for it, so a process
+    never takes frames off the queues of cameras it doesn't read.
+    """
+
+    def __init__(self,
+                 camera_ids=(),
+                 host=os.getenv("RABBITMQ_HOST","127.0.0"),
+                 port = os.getenv("RABBITMQ_PORT",5672),
+                 username = os.getenv("RABBITMQ_USER","user"),
+                 password = os.getenv("RABBITMQ_PASS","password"),
+                 exchange = config.RABBITMQ_EXCHANGE or "frames",
+                 exchange_type = config.RABBITMQ_EXCHANGE_TYPE,
+                 prefetch = config.RABBITMQ_PREFETCH,
+                 buffer_size = 30,
+                 ):
+        self.camera_ids = []
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        self.prefetch = prefetch
+        self.ack_every = max(1, prefetch // 2)
+        self.buffer_size = buffer_size
+        self.queues = {}
+        self.dropped = {}
+        self.bound = set()
+        self.lock = threading.Lock()
+        self.connection = None
+        self.channel = None
+        self.last_tag = None
+        self.unacked = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="rabbitmq-demux", daemon=True)
+        for camera_id in camera_ids:
+            self.add_camera(camera_id)
+
+    def add_camera(self, camera_id):
+        """Start buffering `camera_id`; its queue is consumed from the next pass of the consumer thread."""
+        with self.lock:
+            if camera_id not in self.queues:
+                self.dropped[camera_id] = 0
+                self.queues[camera_id] = queue.Queue(maxsize=self.buffer_size)
+                self.camera_ids.append(camera_id)
+
+    def _bind_cameras(self):
+        with self.lock:
+            new_ids = [camera_id for camera_id in self.camera_ids if camera_id not in self.bound]
+        for camera_id in new_ids:
+            queue_name = declare_camera_queue(self.channel, self.exchange, self.exchange_type, camera_id)
+            self.channel.basic_consume(queue=queue_name, on_message_callback=partial(self._on_message, camera_id),
+                                       auto_ack=False)
+            self.bound.add(camera_id)
+        if new_ids:
+            logging.info(f"Demultiplexing cameras {self.camera_ids} from {self.host}")
+
+    def connect(self):
+        credentials = pika.PlainCredentials(self.username, self.password)
+        parameters = pika.ConnectionParameters(
+            host=self.host,
+            port=self.port,
+            credentials=credentials,
+            heartbeat=300,
+            blocked_connection_timeout=300
+        )
+        self.connection = pika.BlockingConnection(parameters)
+        self.channel = self.connection.channel()
+        self.channel.basic_qos(prefetch_count=self.prefetch)
+        self.last_tag = None
+        self.unacked = 0
+        self.bound = set()
+
+    def _on_message(self, camera_id, channel, method, properties, body):
+        frames = self.queues[camera_id]
+        while True:
+            try:
+                frames.put_nowait(body)
+                break
+            except queue.Full:
+                try:
+                    frames.get_nowait()
+                    self.dropped[camera_id] += 1
+                except queue.Empty:
+                    pass
+        # Delivery tags are per channel, so one multiple=True ack covers every camera
+        self.last_tag = method.delivery_tag
+        self.unacked += 1
+        if self.unacked >= self.ack_every:
+            self._ack()
+
+    def _ack(self):
+        if self.unacked:
+            self.channel.basic_ack(delivery_tag=self.last_tag, multiple=True)
+            self.unacked = 0
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.connection is None or self.connection.is_closed:
+                    self.connect()
+                # pika channels aren't thread-safe, so new cameras are bound from this thread
+                self._bind_cameras()
+                self.connection.process_data_events(time_limit=1)
+                self._ack()
+            except Exception as e:
+                logging.error(f"RabbitMQ demux error, reconnecting: {e}")
+                self.connection = None
+                time.sleep(5)
+        if self.connection and not self.connection.is_closed:
+            self._ack()
+            self.connection.close()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def camera(self, camera_id):
+        """Reader for `camera_id`, subscribing to its queue if this process doesn't read it yet."""
+        if not camera_id:
+            raise ValueError("A camera id is required to read from the demultiplexer")
+        self.add_camera(camera_id)
+        return DemuxCamera(self, camera_id)
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=10)
+
+
+_demux = None
+_demux_lock = threading.Lock()
+
+
+def get_demux():
+    """
+    Process-wide RabbitMQDemux, started on first use. It consumes only the cameras this
+    process asks for through `camera()`.
+    """
+    global _demux
+    with _demux_lock:
+        if _demux is None:
+            _demux = RabbitMQDemux().start()
+        return _demux
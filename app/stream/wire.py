@@ -0,0 +1,73 @@
+import time
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Binary frame envelope, an alternative to the legacy {"camera_id", "payload": base64} JSON:
+#
+#   magic     4s  b"TFRM"
+#   version   B
+#   codec     B   CODEC_*
+#   width     H   pixels (0 when the body is not an image, e.g. a TS chunk)
+#   height    H
+#   seq       Q   per-camera sequence number
+#   timestamp d   capture time, epoch seconds
+#   id_len    B   followed by id_len bytes of utf-8 camera id
+#
+# then the body: JPEG bytes, raw BGR24 pixels (height * width * 3) or an MPEG-TS chunk.
+MAGIC = b"TFRM"
+VERSION = 1
+HEADER = struct.Struct("!4sBBHHQdB")
+
+CODEC_JPEG = 0
+CODEC_RAW_BGR = 1
+CODEC_MPEGTS = 2
+
+FrameHeader = namedtuple("FrameHeader", ["codec", "width", "height", "seq", "timestamp", "camera_id"])
+
+
+def is_binary(body):
+    return body[:4] == MAGIC
+
+
+def pack(body, camera_id, seq, codec=CODEC_JPEG, width=0, height=0, timestamp=None):
+    camera = str(camera_id).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, codec, width, height, seq,
+                         time.time() if timestamp is None else timestamp, len(camera))
+    return b"".join((header, camera, body))
+
+
+def unpack(message):
+    """Split an envelope into (FrameHeader, body); the body is a zero-copy memoryview."""
+    view = memoryview(message)
+    magic, version, codec, width, height, seq, timestamp, id_len = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} frame envelope")
+    offset = HEADER.size + id_len
+    camera_id = bytes(view[HEADER.size:offset]).decode("utf-8")
+    return FrameHeader(codec, width, height, seq, timestamp, camera_id), view[offset:]
+
+
+def encode_frame(frame, camera_id, seq, codec=CODEC_JPEG, quality=90, timestamp=None):
+    """Producer-side helper: wrap a BGR frame as JPEG or raw pixels."""
+    height, width = frame.shape[:2]
+    if codec == CODEC_JPEG:
+        ok, body = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        body = body.tobytes()
+    elif codec == CODEC_RAW_BGR:
+        body = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+    else:
+        raise ValueError(f"Unsupported image codec {codec}")
+    return pack(body, camera_id, seq, codec=codec, width=width, height=height, timestamp=timestamp)
+
+
+def decode_image(header, body):
+    if header.codec == CODEC_JPEG:
+        return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+    if header.codec == CODEC_RAW_BGR:
+        return np.frombuffer(body, np.uint8).reshape(header.height, header.width, 3)
+    raise ValueError(f"Codec {header.codec} is not an image")
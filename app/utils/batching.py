@@ -0,0 +1,188 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+
+from app import config
+
+logger = logging.getLogger("Batching")
+
+
+def parse_address(address):
+    """
+    Turn "host:port" into a (host, port) tuple, anything else is a unix socket path.
+    A bare ":port" means localhost; listening on other interfaces has to be asked for by host.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def get_authkey():
+    """
+    BATCH_SERVER_AUTHKEY as bytes. Connections exchange pickles, so a peer that passes the
+    handshake can run code in the server; there is deliberately no default key.
+    """
+    if not config.BATCH_SERVER_AUTHKEY:
+        raise ValueError("BATCH_SERVER_AUTHKEY is not set in the .env file")
+    return config.BATCH_SERVER_AUTHKEY.encode()
+
+
+class DynamicBatcher:
+    """
+    Collects single requests from many callers and hands them to `handler` as one list.
+
+    A batch is flushed as soon as it reaches `max_batch_size` or when `max_wait` seconds
+    have passed since its first item arrived, whichever comes first. `handler` must return
+    one result per item, in order.
+    """
+
+    def __init__(self, handler, max_batch_size=8, max_wait=0.02, name="batcher"):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.requests.put((item, future))
+        return future
+
+    def _collect(self):
+        try:
+            first = self.requests.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            items, futures = zip(*batch)
+            try:
+                results = self.handler(list(items))
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+            self.batches += 1
+            self.items += len(items)
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+
+class BatchServer:
+    """Exposes a DynamicBatcher to other processes over a multiprocessing connection."""
+
+    def __init__(self, batcher, address, authkey):
+        self.batcher = batcher
+        self.address = parse_address(address)
+        self.authkey = authkey
+
+    def serve_forever(self):
+        self.batcher.start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Batch server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f"Error accepting connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        send_lock = threading.Lock()
+        peer = None
+
+        def reply(request_id, future):
+            error = future.exception()
+            response = (request_id, None, str(error)) if error else (request_id, future.result(), None)
+            try:
+                with send_lock:
+                    conn.send(response)
+            except (OSError, EOFError) as e:
+                logger.warning(f"Could not reply to {peer}: {e}")
+
+        try:
+            while True:
+                peer, request_id, payload = conn.recv()
+                future = self.batcher.submit(payload)
+                future.add_done_callback(lambda f, rid=request_id: reply(rid, f))
+        except EOFError:
+            logger.info(f"Client {peer} disconnected")
+        except Exception as e:
+            logger.error(f"Error serving client {peer}: {e}")
+        finally:
+            conn.close()
+
+
+class BatchClient:
+    """Synchronous client for a BatchServer; one outstanding request at a time."""
+
+    def __init__(self, address, authkey, name=None, timeout=10.0):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.name = name
+        self.timeout = timeout
+        self.conn = None
+        self.request_id = 0
+
+    def connect(self):
+        self.conn = Client(self.address, authkey=self.authkey)
+        logger.info(f"Connected to batch server at {self.address}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def call(self, payload):
+        if self.conn is None:
+            self.connect()
+        self.request_id += 1
+        try:
+            self.conn.send((self.name, self.request_id, payload))
+            while True:
+                if not self.conn.poll(self.timeout):
+                    raise TimeoutError(f"No response from batch server within {self.timeout}s")
+                request_id, result, error = self.conn.recv()
+                if request_id == self.request_id:
+                    break
+        except (OSError, EOFError, TimeoutError):
+            self.close()
+            raise
+        if error:
+            raise RuntimeError(error)
+        return result
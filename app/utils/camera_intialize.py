@@ -4,7 +4,8 @@ import logging
 import time
 from dotenv import load_dotenv
 
-from app.stream.rabbitmq import RabbitMQ
+from app import config
+from app.stream.rabbitmq import RabbitMQ, get_demux
 from app.stream.chunks_process import FrameProcessor
 from antmedia_ser.webrtc_sub import AntMediaCamera
 
@@ -19,6 +20,10 @@ class CameraInit:
             logger.info(" ::: RABBITMQ INITIATED ::: ")
             video = RabbitMQ()
             video.connect()
+        elif client_type == "rabbitmq-demux":
+            # Consumes only this process's camera queue; cameras opened in the same process share the connection
+            logger.info(" ::: RABBITMQ DEMUX INITIATED ::: ")
+            video = get_demux().camera(config.RABBITMQ_CAMERAID)
         elif client_type == "chunks":
             video = FrameProcessor()
             
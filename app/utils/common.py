@@ -1,3 +1,4 @@
+import time
 import pickle
 import redis
 
@@ -11,12 +12,17 @@ def singleton(cls):
             instances[cls] = cls()
         return instances[cls]
     
+    # The undecorated class, for building independent instances (e.g. in tests)
+    get_instance.__wrapped__ = cls
     return get_instance
 
 @singleton
 class CacheHelper:
     def __init__(self):
         self.redis_cache = redis.StrictRedis(host="localhost", port=6379, db=0, socket_timeout=1)
+        # Blocking pops outlive the 1s socket timeout above, so they get their own connection
+        self.blocking_cache = redis.StrictRedis(host="localhost", port=6379, db=0, socket_timeout=None)
+        self.pop_failures = 0
         print("REDIS CACHE UP!")
 
     def get_redis_pipeline(self):
@@ -42,3 +48,74 @@ class CacheHelper:
             return None
         except redis.ConnectionError:
             return None
+
+
+    @staticmethod
+    def processing_key(queue):
+        return f"{queue}:processing"
+
+    @staticmethod
+    def attempts_key(queue):
+        return f"{queue}:attempts"
+
+    @staticmethod
+    def failed_key(queue):
+        return f"{queue}:failed"
+
+    def push_event(self, queue, obj):
+        """Append a serialized event to a Redis list used as a work queue."""
+        try:
+            return self.redis_cache.lpush(queue, pickle.dumps(obj))
+        except redis.ConnectionError:
+            return None
+
+    def pop_event(self, queue, timeout=5):
+        """
+        Block up to `timeout` seconds for the next event and atomically move it to the
+        queue's processing list. Returns (token, event) or None; pass the token to
+        `ack_event` once the event is fully handled.
+        """
+        try:
+            raw = self.blocking_cache.blmove(queue, self.processing_key(queue), timeout, "RIGHT", "LEFT")
+            self.pop_failures = 0
+        except redis.ConnectionError:
+            # Back off while Redis is down instead of spinning the consumer loop
+            self.pop_failures += 1
+            time.sleep(min(2 ** self.pop_failures, 30))
+            return None
+        if raw is None:
+            return None
+        return raw, pickle.loads(raw)
+
+    def ack_event(self, queue, token):
+        try:
+            pipe = self.redis_cache.pipeline()
+            pipe.lrem(self.processing_key(queue), 1, token)
+            pipe.hdel(self.attempts_key(queue), token)
+            return pipe.execute()[0]
+        except redis.ConnectionError:
+            return None
+
+    def fail_event(self, queue, token, max_attempts=3):
+        """
+        Give up on this attempt at an event: put it back on the queue for another try, or move
+        it to the queue's failed list once it has failed `max_attempts` times. Returns the
+        number of attempts so far.
+        """
+        attempts = self.redis_cache.hincrby(self.attempts_key(queue), token, 1)
+        pipe = self.redis_cache.pipeline()
+        pipe.lrem(self.processing_key(queue), 1, token)
+        if attempts < max_attempts:
+            pipe.rpush(queue, token)
+        else:
+            pipe.lpush(self.failed_key(queue), token)
+            pipe.hdel(self.attempts_key(queue), token)
+        pipe.execute()
+        return attempts
+
+    def requeue_unacked(self, queue):
+        """Put events left in the processing list by a crashed consumer back on the queue."""
+        count = 0
+        while self.redis_cache.lmove(self.processing_key(queue), queue, "LEFT", "RIGHT") is not None:
+            count += 1
+        return count
@@ -3,16 +3,17 @@ import datetime
 import asyncio
 import uuid
 import logging
-import boto3
-from botocore.exceptions import ClientError
-import subprocess
 import time
 
 from app.utils.common import CacheHelper
 from app import config
 from app.utils.message import TheftMessage
+from app.utils.evidence import upload_evidence
+from app.utils.shm_transport import release_frames
+from app.utils.storage import create_storage
 from app.kafka.asyncio.producer import CustomAIOKafkaProducer
-from app.RMQ.producer import TheftDetectionProducer
+from app.RMQ.async_producer import AsyncTheftDetectionProducer
+from app.utils.outbox import Outbox, OutboxDispatcher
 
 logger = logging.getLogger("Custom Process")
 
@@ -20,151 +21,136 @@ logger = logging.getLogger("Custom Process")
 class CustomProcess():
     def __init__(self, *args, **kwargs):
         super(CustomProcess, self).__init__(*args, **kwargs)
-        self.create_folder()
+        self.storage = create_storage()
+        self.rmq_producer = None
+        self.kafka_producer = None
+        self.outbox = Outbox(config.OUTBOX_PATH, sinks=("rabbitmq", "kafka"))
     
     
-    def create_folder(self):
+    async def send_rabbitmq(self, batch):
+        await self.rmq_producer.publish_batch([
+            self.rmq_producer.detection(trace_id, event["camera_id"], event["s3_url"], event["local_timestamp"],
+                                        event["theft_probability"], event["store_id"])
+            for trace_id, event in batch
+        ])
+        logger.info(f"Sent {len(batch)} theft detection messages to RabbitMQ")
+
+    async def send_kafka(self, batch):
+        if self.kafka_producer is None:
+            kafka_producer = CustomAIOKafkaProducer()
+            try:
+                await kafka_producer.start()
+            except Exception:
+                await kafka_producer.stop()
+                raise
+            self.kafka_producer = kafka_producer
+            logger.info(":::connected to KAFKA:::")
+        messages = [(trace_id, TheftMessage(
+            camera_id=event["camera_id"],
+            timestamp=event["timestamp"],
+            s3_url=event["s3_url"],
+            trace_id=trace_id,
+            theft_probability=event["theft_probability"],
+            model_version=event["model_version"]
+        )) for trace_id, event in batch]
         try:
-            os.mkdir('theft_videos')
-        except FileExistsError:
-            pass
+            await self.kafka_producer.produce_batch(topic=os.getenv("KAFKA_TOPIC", 'theft-detect-topic'), messages=messages)
+        except Exception:
+            await self.kafka_producer.stop()
+            self.kafka_producer = None
+            raise
 
-    def upload_file_and_get_direct_url(self, file_name, bucket, object_name=None):
-        if object_name is None:
-            object_name = file_name
+    async def handle_alert(self, alert):
+        logger.info(":::CUSTOM THREAD IS GETTING EXECUTED:::")
         
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-            region_name='us-east-2'
-        )
-
-        try:
-            s3.upload_file(file_name, bucket, object_name)
-            url = f"https://{bucket}.s3.{s3.meta.region_name}.amazonaws.com/{object_name}"
-            logger.info(f"File {file_name} uploaded successfully to {bucket}/{object_name}")
-            return url
-        except ClientError as e:
-            logger.info(f"Error uploading file: {e}")
-            return None
+        frame_current_time = alert[3]
+        frame_rate = alert[0]
+        theft_res = alert[2]
+        evidence = alert[1]
         
-    def send_rabbitmq_message(self, camera_id, url, trace_id, timestamp, theft_res,store_id):
-        try:
-            self.rmq_producer.publish_detection(trace_id, camera_id, url, timestamp, theft_res,store_id)
-            logger.info(f"Sent theft detection message to RabbitMQ for camera {camera_id} with trace_id {trace_id}")
-        except Exception as e:
-            logger.info(f"Error sending message to RabbitMQ for camera {camera_id}: {e}")
-            while True:
-                try:
-                    self.rmq_producer = TheftDetectionProducer()
-                    logger.info(":::connected to RABBITMQ:::")
-                    break
-                except:
-                    continue
-            self.rmq_producer.publish_detection(trace_id, camera_id, url, timestamp, theft_res,store_id)
-            logger.info(f"Sent theft detection message to RabbitMQ for camera {camera_id} with trace_id {trace_id}")
-
-    def write_video(self, frames, output_path, fps=15):
-        if not frames:
-            return
-            
-        command = [
-            'ffmpeg',
-            '-y',
-            '-f', 'rawvideo',
-            '-vcodec', 'rawvideo',
-            '-s', f'{frames[0].shape[1]}x{frames[0].shape[0]}',
-            '-pix_fmt', 'bgr24',
-            '-r', str(fps),
-            '-i', '-',
-            '-an',
-            '-vcodec', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            output_path
-        ]
+        timestamp = datetime.datetime.fromisoformat(str(frame_current_time))
+        timestamp = timestamp.replace(tzinfo=None) 
+        timestamp = timestamp.isoformat()
         
-        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        camera_id = os.getenv("RABBITMQ_CAMERAID", "000")
+        # Derived from the alert itself, so an alert re-queued after a crash keeps its key
+        trace_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{camera_id}/{frame_current_time}"))
+        if self.outbox.exists(trace_id):
+            logger.info(f"Alert {trace_id} is already in the outbox")
+            return
         
-        for frame in frames:
-            if frame is None:
-                continue
-            process.stdin.write(frame.tobytes())
+        video_path = f'theft_videos/{timestamp}.mp4'
+        # Encoded straight into the upload, nothing is written to local disk
+        loop = asyncio.get_running_loop()
+        url = await loop.run_in_executor(None, upload_evidence, self.storage, evidence,
+                                         config.AWS_OBJECT_NAME + '/' + video_path, frame_rate)
+        logger.info(url)
+        if url is None:
+            return
         
-        process.stdin.close()
-        process.wait()
+        event = {
+            "camera_id": camera_id,
+            "store_id": os.getenv("STORE_ID"),
+            "s3_url": url,
+            "timestamp": str(frame_current_time),
+            "local_timestamp": timestamp,
+            "theft_probability": float(theft_res),
+            "model_version": "v1.0.0",
+        }
+        self.outbox.append(trace_id, event)
+        self.dispatcher.notify()
+        logger.info(f"Queued alert {trace_id} for delivery")
 
     async def run_process(self):
         rch = CacheHelper()
+        loop = asyncio.get_running_loop()
         
-        # Try to establish connections
-        while True:
-            try:
-                self.rmq_producer = TheftDetectionProducer()
-                logger.info(":::connected to RABBITMQ:::")
-                kafka_producer = CustomAIOKafkaProducer()
-                await kafka_producer.start()
-                logger.info(":::connected to KAFKA:::")
-                break
-            except Exception as e:
-                logger.info(f"Error connecting to kafka or Rabbitmq: {str(e)}")
-                time.sleep(1)
-                continue
+        self.rmq_producer = AsyncTheftDetectionProducer()
+
+        # Alerts are acknowledged once they are in the outbox; the dispatcher owns delivery from there
+        self.dispatcher = OutboxDispatcher(
+            self.outbox,
+            {"rabbitmq": self.send_rabbitmq, "kafka": self.send_kafka},
+            batch_size=config.OUTBOX_BATCH_SIZE,
+            poll_interval=config.OUTBOX_POLL_INTERVAL,
+            retention=config.OUTBOX_RETENTION_HOURS * 3600,
+        )
+        backlog = self.outbox.backlog()
+        if backlog:
+            logger.info(f"Outbox backlog from a previous run: {backlog}")
+        # Broker connections are made (and re-made) by the sinks, so an outage only grows the outbox
+        self.dispatcher_task = asyncio.create_task(self.dispatcher.run())
 
+        recovered = False
         while True:
             try:
-                await asyncio.sleep(1)  # Non-blocking sleep
-                logger.info("-----")
-                frames = rch.get_json("theft_result")
-                if not frames:
-                    continue
-                    
-                logger.info(":::CUSTOM THREAD IS GETTING EXECUTED:::")
-                
-                frame_current_time = frames[3]
-                frame_rate = frames[0]
-                theft_res = frames[2]
-                frames = list(frames[1])
-                
-                timestamp = datetime.datetime.fromisoformat(str(frame_current_time))
-                timestamp = timestamp.replace(tzinfo=None) 
-                timestamp = timestamp.isoformat()
-                
-                video_path = f'theft_videos/{timestamp}.mp4'
-                self.write_video(frames, video_path, fps=frame_rate)
+                if not recovered:
+                    requeued = rch.requeue_unacked(config.ALERT_QUEUE)
+                    if requeued:
+                        logger.info(f"Re-queued {requeued} unacknowledged alerts from a previous run")
+                    recovered = True
 
-                url = self.upload_file_and_get_direct_url(
-                    file_name=video_path,
-                    bucket=config.AWS_BUCKET,
-                    object_name=config.AWS_OBJECT_NAME + '/' + video_path
-                )
-                logger.info(url)
-                
-                trace_id = str(uuid.uuid4())
-                camera_id = os.getenv("RABBITMQ_CAMERAID", "000")
-                store_id = os.getenv("STORE_ID")
-                
-                message = TheftMessage(
-                    camera_id=camera_id,
-                    timestamp=frame_current_time,
-                    s3_url=url,
-                    trace_id=trace_id,
-                    theft_probability=theft_res,
-                    model_version="v1.0.0"
-                )
-                
-                logger.info(":::::::::::BEFORE RABBITMQ PRODUCER:::::::::::")
-                self.send_rabbitmq_message(camera_id, url, trace_id, timestamp, theft_res,store_id)
-                logger.info(":::::::::::AFTER RABBITMQ PRODUCER:::::::::::")
-
-                logger.info(":::::::::::BEFORE KAFKA PRODUCER:::::::::::")
-                await kafka_producer.produce(topic=os.getenv("KAFKA_TOPIC", 'theft-detect-topic'), message=message)
-                logger.info(":::::::::::AFTER KAFKA PRODUCER:::::::::::")
-                
-                os.remove(video_path)
+                # Blocking pop runs in a worker thread so the event loop (Kafka token refresh) keeps going
+                event = await loop.run_in_executor(None, rch.pop_event, config.ALERT_QUEUE, config.ALERT_POP_TIMEOUT)
+                if event is None:
+                    continue
+                token, alert = event
+                try:
+                    await self.handle_alert(alert)
+                except Exception as e:
+                    attempts = rch.fail_event(config.ALERT_QUEUE, token, config.ALERT_MAX_ATTEMPTS)
+                    if attempts < config.ALERT_MAX_ATTEMPTS:
+                        logger.warning(f"Alert failed (attempt {attempts}), re-queued: {e}")
+                    else:
+                        logger.error(f"Alert failed {attempts} times, moved to {rch.failed_key(config.ALERT_QUEUE)}: {e}")
+                        release_frames(alert[1])
+                    continue
+                rch.ack_event(config.ALERT_QUEUE, token)
+                release_frames(alert[1])
                 
             except Exception as e:
                 logger.info(f"Error in Custom thread function: {str(e)}")
+                await asyncio.sleep(1)
                 
 
 
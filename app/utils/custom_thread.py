@@ -5,13 +5,12 @@ from queue import Queue
 from threading import Thread
 import uuid
 import logging
-import cv2
-import boto3
-from botocore.exceptions import ClientError
-import subprocess
 
 from app import config
 from app.utils.message import TheftMessage
+from app.utils.evidence import upload_evidence
+from app.utils.shm_transport import release_frames
+from app.utils.storage import create_storage
 from app.kafka.asyncio.producer import CustomAIOKafkaProducer
 from app.RMQ.producer import TheftDetectionProducer
 
@@ -23,36 +22,11 @@ class CustomThread(Thread):
         super().__init__(**kwargs)
         self.q = q
         self.producer = producer
+        self.storage = create_storage()
 
     def run(self):
         asyncio.run(self.run_async())
     
-    def create_folder(self):
-        try:
-            os.mkdir('theft_videos')
-        except FileExistsError:
-            pass
-
-    def upload_file_and_get_direct_url(self, file_name, bucket, object_name=None):
-        if object_name is None:
-            object_name = file_name
-        
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-            region_name='us-east-2'
-        )
-
-        try:
-            s3.upload_file(file_name, bucket, object_name)
-            url = f"https://{bucket}.s3.{s3.meta.region_name}.amazonaws.com/{object_name}"
-            logger.info(f"File {file_name} uploaded successfully to {bucket}/{object_name}")
-            return url
-        except ClientError as e:
-            logger.info(f"Error uploading file: {e}")
-            return None
-        
     def send_rabbitmq_message(self, camera_id, url, trace_id, timestamp, theft_res):
         try:
             self.rmq_producer.publish_detection(trace_id, camera_id, url, timestamp, theft_res)
@@ -69,35 +43,6 @@ class CustomThread(Thread):
             self.rmq_producer.publish_detection(trace_id, camera_id, url, timestamp, theft_res)
             logger.info(f"Sent theft detection message to RabbitMQ for camera {camera_id} with trace_id {trace_id}")
 
-    def write_video(self, frames, output_path, fps=15):
-        if not frames:
-            return
-            
-        command = [
-            'ffmpeg',
-            '-y',
-            '-f', 'rawvideo',
-            '-vcodec', 'rawvideo',
-            '-s', f'{frames[0].shape[1]}x{frames[0].shape[0]}',
-            '-pix_fmt', 'bgr24',
-            '-r', str(fps),
-            '-i', '-',
-            '-an',
-            '-vcodec', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            output_path
-        ]
-        
-        process = subprocess.Popen(command, stdin=subprocess.PIPE)
-        
-        for frame in frames:
-            if frame is None:
-                continue
-            process.stdin.write(frame.tobytes())
-        
-        process.stdin.close()
-        process.wait()
-        
     async def run_async(self):
         while True:
             try:
@@ -119,23 +64,21 @@ class CustomThread(Thread):
                 frame_current_time = frames[3]
                 frame_rate = frames[0]
                 theft_res = frames[2]
-                frames = list(frames[1])
-                
-                self.create_folder()
+                evidence = frames[1]
                 
                 timestamp = datetime.datetime.fromisoformat(str(frame_current_time))
                 timestamp = timestamp.replace(tzinfo=None) 
                 timestamp = timestamp.isoformat()
                 
                 video_path = f'theft_videos/{timestamp}.mp4'
-                self.write_video(frames, video_path, fps=frame_rate)
-
-                url = self.upload_file_and_get_direct_url(
-                    file_name=video_path,
-                    bucket=config.AWS_BUCKET,
-                    object_name=config.AWS_OBJECT_NAME + '/' + video_path
-                )
+                try:
+                    url = upload_evidence(self.storage, evidence, config.AWS_OBJECT_NAME + '/' + video_path, fps=frame_rate)
+                finally:
+                    # This path never retries, so the frame snapshot is done with either way
+                    release_frames(evidence)
                 logger.info(url)
+                if url is None:
+                    continue
                 
                 trace_id = str(uuid.uuid4())
                 camera_id = os.getenv("RABBITMQ_CAMERAID", "000")
@@ -157,12 +100,10 @@ class CustomThread(Thread):
                 self.send_rabbitmq_message(camera_id, url, trace_id, timestamp, theft_res)
                 logger.info(":::::::::::AFTER RABBITMQ PRODUCER:::::::::::")
                 
-                os.remove(video_path)
-                
                 # Clear queue to prevent backlog
                 while not self.q.empty():
                     try:
-                        _ = self.q.get_nowait()
+                        release_frames(self.q.get_nowait()[1])
                     except:
                         break
                         
@@ -0,0 +1,271 @@
+import os
+import time
+import queue
+import logging
+import threading
+import subprocess
+from collections import deque
+
+from app import config
+from app.utils.shm_transport import SharedFrameRing, resolve_frames
+
+logger = logging.getLogger("Evidence")
+
+
+class SegmentRecorder:
+    """
+    Continuously encodes the camera feed into short, keyframe-aligned MPEG-TS segments.
+
+    Segments are named after their wall-clock start time and kept for `keep_seconds`, so
+    an alert clip is just the segments overlapping its time range joined with `-c copy`.
+    Frames are handed to ffmpeg from a bounded queue on a writer thread; if the encoder
+    falls behind, frames are dropped rather than stalling inference.
+
+    It offers the same write / descriptor / close interface as SharedFrameRing.
+    """
+
+    def __init__(self, segment_dir, size=(480, 360), segment_seconds=2, keep_seconds=120,
+                 capacity=None, queue_size=60):
+        self.segment_dir = segment_dir
+        self.size = size
+        self.segment_seconds = segment_seconds
+        self.keep_seconds = keep_seconds
+        self.frame_times = deque(maxlen=capacity or config.SHM_RING_SLOTS)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        os.makedirs(segment_dir, exist_ok=True)
+
+        self.process = self._start_encoder()
+        self.thread = threading.Thread(target=self._run, name="segment-recorder", daemon=True)
+        self.thread.start()
+
+    def _start_encoder(self):
+        command = [
+            'ffmpeg',
+            '-y',
+            '-loglevel', 'error',
+            '-f', 'rawvideo',
+            '-vcodec', 'rawvideo',
+            '-s', f'{self.size[0]}x{self.size[1]}',
+            '-pix_fmt', 'bgr24',
+            '-use_wallclock_as_timestamps', '1',
+            '-i', '-',
+            '-an',
+            '-vsync', 'vfr',
+            '-vcodec', 'libx264',
+            '-preset', 'veryfast',
+            '-tune', 'zerolatency',
+            '-pix_fmt', 'yuv420p',
+            '-force_key_frames', f'expr:gte(t,n_forced*{self.segment_seconds})',
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-segment_format', 'mpegts',
+            '-reset_timestamps', '1',
+            '-strftime', '1',
+            os.path.join(self.segment_dir, '%s.ts'),
+        ]
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.frame_times.append(time.time())
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+
+    def descriptor(self, count):
+        times = list(self.frame_times)[-count:]
+        return {
+            "segment_dir": self.segment_dir,
+            "segment_seconds": self.segment_seconds,
+            "start": times[0] if times else time.time(),
+            "end": times[-1] if times else time.time(),
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for name, start in list_segments(self.segment_dir):
+            if start < cutoff:
+                try:
+                    os.remove(os.path.join(self.segment_dir, name))
+                except OSError:
+                    pass
+
+    def _run(self):
+        last_prune = time.time()
+        while not self.stop_event.is_set():
+            try:
+                frame = self.frames.get(timeout=0.5)
+                self.process.stdin.write(frame.tobytes())
+            except queue.Empty:
+                pass
+            except (BrokenPipeError, OSError) as e:
+                logger.error(f"Segment encoder died ({e}), restarting")
+                # Reap the dead encoder so it doesn't linger as a zombie
+                self.process.kill()
+                self.process.wait()
+                self.process = self._start_encoder()
+            if time.time() - last_prune >= self.segment_seconds:
+                self._prune()
+                last_prune = time.time()
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait(timeout=10)
+
+
+def list_segments(segment_dir):
+    """(file name, start epoch) of every finished or in-progress segment, oldest first."""
+    segments = []
+    for name in os.listdir(segment_dir):
+        stem, ext = os.path.splitext(name)
+        if ext == '.ts' and stem.isdigit():
+            segments.append((name, int(stem)))
+    return sorted(segments, key=lambda segment: segment[1])
+
+
+def select_segments(segment_dir, start, end, timeout=None):
+    """
+    Segments covering [start, end]. Waits (up to `timeout`) until a segment starting after
+    `end` exists, i.e. the one containing `end` has been closed by the encoder.
+    """
+    deadline = time.time() + (timeout or 0)
+    while True:
+        segments = list_segments(segment_dir)
+        if any(seg_start > end for _, seg_start in segments) or time.time() >= deadline:
+            break
+        time.sleep(0.2)
+
+    selected = []
+    for i, (name, seg_start) in enumerate(segments):
+        seg_end = segments[i + 1][1] if i + 1 < len(segments) else float('inf')
+        if seg_end > start and seg_start <= end:
+            selected.append(os.path.join(segment_dir, name))
+    return selected
+
+
+FRAGMENTED_MP4 = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4', 'pipe:1']
+
+
+def _pump(command, upload, frames=None, data=None, chunk_size=256 * 1024):
+    """
+    Run ffmpeg, feeding raw frames (or `data` bytes) on stdin from a thread while its stdout
+    goes straight into `upload`. Leaves closing or aborting the upload to the caller.
+    """
+    feeds_stdin = frames is not None or data is not None
+    process = subprocess.Popen(command, stdin=subprocess.PIPE if feeds_stdin else subprocess.DEVNULL,
+                               stdout=subprocess.PIPE)
+
+    def feed():
+        try:
+            if data is not None:
+                process.stdin.write(data)
+            else:
+                for frame in frames:
+                    process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"ffmpeg stopped reading its input: {e}")
+        finally:
+            process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True) if feeds_stdin else None
+    if feeder:
+        feeder.start()
+    try:
+        while True:
+            chunk = process.stdout.read(chunk_size)
+            if not chunk:
+                break
+            upload.write(chunk)
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}")
+    except Exception:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        if feeder:
+            feeder.join()
+
+
+def stream_frames(frames, upload, fps=15):
+    """Encode raw BGR frames to fragmented MP4 and stream it into `upload`."""
+    command = [
+        'ffmpeg',
+        '-y',
+        '-loglevel', 'error',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-s', f'{frames[0].shape[1]}x{frames[0].shape[0]}',
+        '-pix_fmt', 'bgr24',
+        '-r', str(fps),
+        '-i', '-',
+        '-an',
+        '-vcodec', 'libx264',
+        '-pix_fmt', 'yuv420p',
+    ] + FRAGMENTED_MP4
+    _pump(command, upload, frames=frames)
+
+
+def stream_segments(segments, upload):
+    """
+    Join pre-encoded segments without re-encoding, straight into `upload`.
+
+    Uses the concat demuxer (file list on stdin) rather than the concat: protocol: every
+    segment restarts near PTS 0 (-reset_timestamps), and only the demuxer offsets each
+    file's timestamps so they keep increasing across segment boundaries.
+    """
+    file_list = "".join(f"file '{os.path.abspath(segment)}'\n" for segment in segments)
+    command = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'concat',
+        '-safe', '0',
+        '-protocol_whitelist', 'file,pipe',
+        '-i', 'pipe:0',
+        '-c', 'copy',
+    ] + FRAGMENTED_MP4
+    _pump(command, upload, data=file_list.encode())
+
+
+def upload_evidence(storage, evidence, key, fps=15):
+    """Encode (or join) an alert's evidence and stream it to `storage` under `key`; returns the URL."""
+    # Gather the evidence first, so nothing is opened in storage if it can't be found
+    if isinstance(evidence, dict) and "segment_dir" in evidence:
+        segments = select_segments(evidence["segment_dir"], evidence["start"], evidence["end"],
+                                   timeout=evidence["segment_seconds"] + 2)
+        if not segments:
+            logger.warning(f"No evidence segments between {evidence['start']} and {evidence['end']}")
+            return None
+        write = lambda upload: stream_segments(segments, upload)
+    else:
+        frames = [frame for frame in resolve_frames(evidence) if frame is not None]
+        if not frames:
+            logger.warning("No evidence frames to upload")
+            return None
+        write = lambda upload: stream_frames(frames, upload, fps=fps)
+
+    upload = storage.open_upload(key)
+    try:
+        write(upload)
+        return upload.close()
+    except BaseException:
+        # Covers a failed encode as well as a failed complete_multipart_upload
+        upload.abort()
+        raise
+
+
+def create_evidence_buffer(camera_id):
+    """Where main.py keeps the original frames that alert clips are cut from (EVIDENCE_MODE)."""
+    if config.EVIDENCE_MODE == "segments":
+        return SegmentRecorder(
+            os.path.join(config.EVIDENCE_DIR, str(camera_id)),
+            segment_seconds=config.EVIDENCE_SEGMENT_SECONDS,
+            keep_seconds=config.EVIDENCE_KEEP_SECONDS,
+        )
+    return SharedFrameRing.create(f"theft_frames_{camera_id}", config.SHM_RING_SLOTS, (360, 480, 3))
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class FeatureCache:
+    """
+    Fixed-size ring buffer of per-frame features keyed by a monotonically increasing frame index.
+
+    Frame `i` lives in slot `i % capacity`, so a sliding window only needs its newest
+    frames encoded; older ones are read back until they are overwritten.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.features = None
+        self.indices = np.full(capacity, -1, dtype=np.int64)
+
+    def put(self, index, feature):
+        feature = np.asarray(feature)
+        if self.features is None:
+            self.features = np.zeros((self.capacity,) + feature.shape, dtype=feature.dtype)
+        slot = index % self.capacity
+        self.features[slot] = feature
+        self.indices[slot] = index
+
+    def __contains__(self, index):
+        return self.indices[index % self.capacity] == index
+
+    def get(self, indices):
+        """Return the features for `indices` in order; raises KeyError if any was evicted."""
+        indices = np.asarray(indices, dtype=np.int64)
+        slots = indices % self.capacity
+        missing = indices[self.indices[slots] != indices]
+        if missing.size:
+            raise KeyError(f"Features for frames {missing.tolist()} are not cached")
+        return self.features[slots]
@@ -13,4 +13,16 @@ class TheftMessage(BaseModel):
     theft_probability: float
 
     def to_dict(self) -> dict:
-        return self.model_dump(mode="json")
\ No newline at end of file
+        return self.model_dump(mode="json")
+
+
+class WindowProbabilityMessage(BaseModel):
+
+    camera_id: str
+    timestamp: datetime
+    theft_probability: float
+    person_count: int
+    model_version: str = 'v1.0.0'
+
+    def to_dict(self) -> dict:
+        return self.model_dump(mode="json")
@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap scene-change test run before person detection.
+
+    Frames are downscaled to grayscale and compared with a slowly updated background; the
+    frame counts as static when fewer than `threshold` of its pixels changed by more than
+    `pixel_delta`. A full detection is still forced every `max_skip` frames so the cached
+    result never goes stale for long.
+    """
+
+    def __init__(self, threshold=0.005, pixel_delta=25, max_skip=100, size=(160, 120), learning_rate=0.05):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_skip = max_skip
+        self.size = size
+        self.learning_rate = learning_rate
+        self.background = None
+        self.skipped_in_row = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_changed = 1.0
+
+    def is_static(self, image):
+        self.frames += 1
+        small = cv2.cvtColor(cv2.resize(image, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+
+        if self.background is None:
+            self.background = small
+            return False
+
+        diff = cv2.absdiff(small, self.background)
+        self.last_changed = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+
+        if self.last_changed < self.threshold and self.skipped_in_row < self.max_skip:
+            self.skipped_in_row += 1
+            self.skipped += 1
+            return True
+        self.skipped_in_row = 0
+        return False
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "changed_fraction": round(self.last_changed, 4),
+        }
@@ -0,0 +1,182 @@
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger("Outbox")
+
+
+class Outbox:
+    """
+    Durable, append-only SQLite outbox for alert events.
+
+    Every event is stored once under an idempotency key together with one delivery row per
+    sink (e.g. "kafka", "rabbitmq"). Sinks are tracked independently, so an outage of one
+    broker neither blocks nor duplicates delivery to the other, and events survive restarts
+    until every sink has acknowledged them.
+    """
+
+    def __init__(self, path, sinks, max_backoff=300.0):
+        self.path = path
+        self.sinks = tuple(sinks)
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deliveries (
+                event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+                sink TEXT NOT NULL,
+                delivered_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                PRIMARY KEY (event_id, sink)
+            );
+            CREATE INDEX IF NOT EXISTS deliveries_pending
+                ON deliveries (sink, delivered_at, next_attempt_at);
+        """)
+
+    def append(self, idempotency_key, payload):
+        """Store an event; appending the same key twice is a no-op. Returns True if it was new."""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO events (idempotency_key, payload, created_at) VALUES (?, ?, ?)",
+                    (idempotency_key, json.dumps(payload), time.time()),
+                )
+                if cursor.rowcount:
+                    self.db.executemany(
+                        "INSERT INTO deliveries (event_id, sink) VALUES (?, ?)",
+                        [(cursor.lastrowid, sink) for sink in self.sinks],
+                    )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return bool(cursor.rowcount)
+
+    def exists(self, idempotency_key):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM events WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return row is not None
+
+    def pending(self, sink, limit=50):
+        """Oldest undelivered events for `sink` that are due, as (event_id, key, payload)."""
+        with self.lock:
+            rows = self.db.execute(
+                """SELECT e.id, e.idempotency_key, e.payload FROM deliveries d JOIN events e ON e.id = d.event_id
+                   WHERE d.sink = ? AND d.delivered_at IS NULL AND d.next_attempt_at <= ?
+                   ORDER BY e.id LIMIT ?""",
+                (sink, time.time(), limit),
+            ).fetchall()
+        return [(event_id, key, json.loads(payload)) for event_id, key, payload in rows]
+
+    def mark_delivered(self, sink, event_ids):
+        with self.lock:
+            self.db.executemany(
+                "UPDATE deliveries SET delivered_at = ?, last_error = NULL WHERE sink = ? AND event_id = ?",
+                [(time.time(), sink, event_id) for event_id in event_ids],
+            )
+
+    def mark_failed(self, sink, event_ids, error, backoff=1.0):
+        with self.lock:
+            for event_id in event_ids:
+                self.db.execute(
+                    """UPDATE deliveries SET attempts = attempts + 1, last_error = ?,
+                       next_attempt_at = ? + MIN(?, ? * (1 << MIN(attempts, 16)))
+                       WHERE sink = ? AND event_id = ?""",
+                    (str(error), time.time(), self.max_backoff, backoff, sink, event_id),
+                )
+
+    def backlog(self):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT sink, COUNT(*) FROM deliveries WHERE delivered_at IS NULL GROUP BY sink"
+            ).fetchall()
+        return dict(rows)
+
+    def purge(self, older_than):
+        """Drop events delivered to every sink that were created more than `older_than` seconds ago."""
+        with self.lock:
+            self.db.execute(
+                """DELETE FROM deliveries WHERE event_id IN (
+                       SELECT e.id FROM events e WHERE e.created_at < ? AND NOT EXISTS (
+                           SELECT 1 FROM deliveries d WHERE d.event_id = e.id AND d.delivered_at IS NULL))""",
+                (time.time() - older_than,),
+            )
+            self.db.execute(
+                "DELETE FROM events WHERE NOT EXISTS (SELECT 1 FROM deliveries d WHERE d.event_id = events.id)"
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class OutboxDispatcher:
+    """
+    Drains an Outbox in batches into async sink callables.
+
+    `sinks` maps a sink name to `async send(batch)`, where batch is a list of
+    (idempotency_key, payload); it must raise if the batch was not acknowledged. Failed
+    batches are retried with exponential backoff without blocking the other sinks.
+    """
+
+    def __init__(self, outbox, sinks, batch_size=50, poll_interval=1.0, retention=86400):
+        self.outbox = outbox
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.wakeup = asyncio.Event()
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def _drain(self, name, send):
+        sent = 0
+        while True:
+            rows = self.outbox.pending(name, self.batch_size)
+            if not rows:
+                return sent
+            event_ids = [event_id for event_id, _, _ in rows]
+            try:
+                await send([(key, payload) for _, key, payload in rows])
+            except Exception as e:
+                logger.error(f"Delivery of {len(rows)} events to {name} failed: {e}")
+                self.outbox.mark_failed(name, event_ids, e)
+                return sent
+            self.outbox.mark_delivered(name, event_ids)
+            sent += len(rows)
+
+    async def run(self):
+        last_purge = 0.0
+        while True:
+            results = await asyncio.gather(*(self._drain(name, send) for name, send in self.sinks.items()),
+                                           return_exceptions=True)
+            for name, result in zip(self.sinks, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Outbox dispatcher error on {name}: {result}")
+                elif result:
+                    logger.info(f"Delivered {result} events to {name}")
+
+            if time.time() - last_purge > 3600:
+                self.outbox.purge(self.retention)
+                last_purge = time.time()
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
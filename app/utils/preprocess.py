@@ -1,12 +1,15 @@
-import os
 import cv2
 import boto3
 import logging
 import numpy as np
 from app import config
-import tensorflow as tf
 from ultralytics import YOLO
 
+from app.utils.batching import BatchClient, get_authkey
+from app.utils.motion import MotionGate
+from app.utils.roi import ROISet
+from app.utils.tracker import BoxTracker, DetectionScheduler
+
 logger = logging.getLogger("PRE PROCESS")
 
 class DownloadWeight:
@@ -35,35 +38,89 @@ except Exception as e:
     yolo_model = "yolov8m.pt"
     person_class = 0
 
+def load_yolo():
+    return YOLO(yolo_model, task="detect")
+
+
+def detect_persons(model, images):
+    """Run YOLO on a list of 640x480 images and return one (N, 4) xyxy int array per image."""
+    results = model.predict(images, verbose=False, classes=person_class, conf=0.5)
+    return [result.boxes.xyxy.cpu().numpy().astype(int) for result in results]
+
+
 class PreProcess:
     def __init__(self) -> None:
-        self.tensorrt_yolo_model = YOLO(yolo_model, task="detect")
+        if config.DETECTION_SERVER_ADDRESS:
+            logger.info(f"Using shared detection server at {config.DETECTION_SERVER_ADDRESS}")
+            self.tensorrt_yolo_model = None
+            self.detection_client = BatchClient(
+                config.DETECTION_SERVER_ADDRESS,
+                authkey=get_authkey(),
+                name=config.RABBITMQ_CAMERAID or config.CAMERA_NO,
+                timeout=config.DETECTION_TIMEOUT,
+            )
+        else:
+            self.tensorrt_yolo_model = load_yolo()
+            self.detection_client = None
+        self.roi = ROISet(width=640, height=480)
+        self.roi_counts = {}
+        self.tracker = BoxTracker()
+        self.scheduler = DetectionScheduler(
+            min_stride=config.DETECT_STRIDE_MIN,
+            max_stride=config.DETECT_STRIDE_MAX,
+            fast_motion=config.DETECT_FAST_MOTION,
+        )
+        self.motion_gate = None
+        if config.MOTION_GATE == "True":
+            self.motion_gate = MotionGate(
+                threshold=config.MOTION_THRESHOLD,
+                pixel_delta=config.MOTION_PIXEL_DELTA,
+                max_skip=config.MOTION_MAX_SKIP,
+            )
+        self.last_mask = None
+        self.last_person_count = 0
+    
+    def detect(self, image):
+        """Person boxes for `image`, or None when the shared detection server can't be reached."""
+        if self.detection_client is not None:
+            try:
+                return self.detection_client.call(image)
+            except (TimeoutError, EOFError, OSError, RuntimeError) as e:
+                # e.g. the detection server is restarting; the client reconnects on the next call
+                logger.warning(f"Detection server call failed: {e}")
+                return None
+        return detect_persons(self.tensorrt_yolo_model, [image])[0]
+    
+    def person_boxes(self, image):
+        """Run the detector when the scheduler asks for it, otherwise extrapolate tracked boxes."""
+        if not self.scheduler.due():
+            return self.tracker.step()
+        detections = self.detect(image)
+        if detections is None:
+            return self.tracker.step()
+        boxes = self.tracker.update(detections)
+        self.scheduler.adapt(self.tracker)
+        return boxes
     
     def preprocess_image(self, image):
         image = cv2.resize(image, (640, 480))
-        mask = np.zeros(image.shape[:2], dtype=np.uint8)
-        results = self.tensorrt_yolo_model.predict(image, verbose=False, classes=person_class, conf=0.5)
+        if self.motion_gate is not None and self.last_mask is not None and self.motion_gate.is_static(image):
+            return self.apply_mask(image, self.last_mask), self.last_person_count
         
-        polygon_str = os.getenv("ROI", "")
-        polygon_points = [list(map(int, point.split('-'))) for point in polygon_str.split(',') if '-' in point]
-        polygon = np.array(polygon_points, np.int32)
-        
-        person_count = 0
+        mask = np.zeros(image.shape[:2], dtype=np.uint8)
+        boxes = np.clip(self.person_boxes(image), 0, [639, 479, 639, 479])
+        centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+        inside = self.roi.contains(centers)
+        self.roi_counts = self.roi.counts(centers)
+        person_count = int(inside.sum())
         
-        for result in results:
-            boxes = result.boxes.xyxy.cpu().numpy().astype(int)
-            for box in boxes:
-                center_x, center_y = (box[0] + box[2]) // 2, (box[1] + box[3]) // 2
-                if polygon_points:
-                    point_inside = cv2.pointPolygonTest(polygon, (float(center_x), float(center_y)), False)
-                    if point_inside >= 0:
-                        person_count += 1
-                        cv2.rectangle(mask, (box[0], box[1]), (box[2], box[3]), 255, -1)
-                else:
-                    person_count += 1
-                    cv2.rectangle(mask, (box[0], box[1]), (box[2], box[3]), 255, -1)
+        for box in boxes[inside]:
+            cv2.rectangle(mask, (box[0], box[1]), (box[2], box[3]), 255, -1)
         
+        self.last_mask, self.last_person_count = mask, person_count
+        return self.apply_mask(image, mask), person_count
+    
+    def apply_mask(self, image, mask):
         result = cv2.bitwise_and(image, image, mask=mask)
         result = cv2.resize(result, (224, 224))
-        result = tf.cast(result, dtype=tf.float32)
-        return result, person_count
+        return result
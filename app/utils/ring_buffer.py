@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Preallocated ring buffer of fixed-shape frames.
+
+    Every frame is written twice, at `i` and `i + capacity`, so the newest `n` frames are
+    always one contiguous slice of the backing array and `window()` can return them in
+    order as a view, without stacking or copying.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        self.capacity = capacity
+        self.buffer = np.zeros((2 * capacity,) + tuple(shape), dtype=dtype)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, frame):
+        self.buffer[self.head] = frame
+        self.buffer[self.head + self.capacity] = frame
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def window(self, n=None):
+        """Read-only view of the newest `n` frames (default: all buffered), oldest first."""
+        n = self.count if n is None else min(n, self.count)
+        end = self.head + self.capacity
+        view = self.buffer[end - n:end]
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,102 @@
+import os
+import logging
+
+import cv2
+import numpy as np
+from dotenv import dotenv_values
+
+logger = logging.getLogger("ROI")
+
+DEFAULT_ROI_NAME = "default"
+
+
+def parse_polygon(polygon_str):
+    """Parse "x1-y1,x2-y2,..." into an (N, 2) int32 array."""
+    points = [list(map(int, point.split('-'))) for point in polygon_str.split(',') if '-' in point]
+    return np.array(points, np.int32).reshape(-1, 2)
+
+
+def parse_rois(rois_str=None, roi_str=None):
+    """
+    Read named ROIs from `ROIS` ("name:x1-y1,x2-y2,...;name2:...") or fall back to the
+    single legacy `ROI` polygon, which is named "default".
+    """
+    rois = {}
+    for entry in (rois_str or "").split(';'):
+        name, sep, polygon_str = entry.partition(':')
+        if not sep:
+            continue
+        polygon = parse_polygon(polygon_str)
+        if len(polygon) >= 3:
+            rois[name.strip()] = polygon
+        else:
+            logger.warning(f"Ignoring ROI {name!r}: needs at least 3 points")
+    if not rois and roi_str:
+        polygon = parse_polygon(roi_str)
+        if len(polygon):
+            rois[DEFAULT_ROI_NAME] = polygon
+    return rois
+
+
+class ROISet:
+    """
+    All ROIs of one camera rasterized once into a lookup mask at the detector resolution.
+
+    Every pixel of the mask holds a bitmask of the ROIs covering it, so membership of any
+    number of points in every ROI is a single array lookup. With no ROI configured every
+    point counts as inside, matching the old behaviour.
+    """
+
+    MAX_ROIS = 32
+
+    def __init__(self, width=640, height=480, rois=None):
+        self.width = width
+        self.height = height
+        self.names = []
+        self.lookup = None
+        if rois is None:
+            self.reload()
+        else:
+            self.set_rois(rois)
+
+    def reload(self):
+        """
+        Re-read ROIS / ROI, preferring a current .env over the process environment. Only
+        these two keys are read; os.environ is left untouched.
+        """
+        values = dotenv_values()
+        self.set_rois(parse_rois(values.get("ROIS") or os.getenv("ROIS", ""),
+                                 values.get("ROI") or os.getenv("ROI", "")))
+
+    def set_rois(self, rois):
+        if len(rois) > self.MAX_ROIS:
+            raise ValueError(f"At most {self.MAX_ROIS} ROIs per camera are supported, got {len(rois)}")
+        lookup = np.zeros((self.height, self.width), dtype=np.uint32)
+        layer = np.zeros((self.height, self.width), dtype=np.uint8)
+        for bit, polygon in enumerate(rois.values()):
+            layer[:] = 0
+            cv2.fillPoly(layer, [polygon], 1)
+            lookup |= layer.astype(np.uint32) << np.uint32(bit)
+        self.names = list(rois)
+        self.lookup = lookup if rois else None
+        logger.info(f"Loaded ROIs: {self.names or 'none (full frame)'}")
+
+    def _bits(self, points):
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x = np.clip(points[:, 0], 0, self.width - 1)
+        y = np.clip(points[:, 1], 0, self.height - 1)
+        return self.lookup[y, x]
+
+    def contains(self, points):
+        """Boolean array: is each (x, y) point inside any ROI."""
+        points = np.asarray(points).reshape(-1, 2)
+        if self.lookup is None:
+            return np.ones(len(points), dtype=bool)
+        return self._bits(points) != 0
+
+    def counts(self, points):
+        """Number of points inside each named ROI."""
+        if self.lookup is None:
+            return {}
+        bits = self._bits(points)
+        return {name: int(((bits >> np.uint32(i)) & 1).sum()) for i, name in enumerate(self.names)}
@@ -0,0 +1,140 @@
+import time
+import logging
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+logger = logging.getLogger("Shared Memory")
+
+
+class SharedFrameRing:
+    """
+    Ring of fixed-shape uint8 frames in a named shared-memory segment.
+
+    The inference process writes every original frame once. When an alert fires, its frames
+    are copied into a segment of their own, so the ring only has to hold one alert's worth
+    of frames however long the alert waits; only a small descriptor (name, shape, sequence
+    range) travels through Redis, and the alert process frees the copy once it is done.
+
+    Each slot carries the sequence number of the frame in it. The writer marks a slot -1
+    while overwriting it, so a reader can tell a frame that was replaced under it.
+    """
+
+    def __init__(self, shm, capacity, shape, owner):
+        self.shm = shm
+        self.name = shm.name
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.owner = owner
+        self.seqs = np.ndarray((capacity,), dtype=np.int64, buffer=shm.buf)
+        self.frames = np.ndarray((capacity,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=self.seqs.nbytes)
+        self.next_seq = 0
+
+    @staticmethod
+    def size(capacity, shape):
+        return capacity * 8 + capacity * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, name, capacity, shape):
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            logger.info(f"Removed stale shared memory segment {name}")
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.size(capacity, shape))
+        ring = cls(shm, capacity, shape, owner=True)
+        ring.seqs[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name, capacity, shape):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers the segment, and the tracker would unlink
+            # the writer's memory when this reader exits
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, capacity, shape, owner=False)
+
+    def write(self, frame):
+        seq = self.next_seq
+        slot = seq % self.capacity
+        self.seqs[slot] = -1
+        self.frames[slot] = frame
+        self.seqs[slot] = seq
+        self.next_seq = seq + 1
+        return seq
+
+    def descriptor(self, count):
+        """
+        Snapshot the newest `count` frames into their own segment and return a small,
+        picklable reference to it. The segment outlives this process until `release_frames`.
+        """
+        count = min(count, self.next_seq, self.capacity)
+        start_seq = self.next_seq - count
+        snapshot = SharedFrameRing.create(f"{self.name}_{int(time.time() * 1000)}", max(count, 1), self.shape)
+        for seq in range(start_seq, self.next_seq):
+            slot = seq % self.capacity
+            snapshot.frames[seq % snapshot.capacity] = self.frames[slot]
+            snapshot.seqs[seq % snapshot.capacity] = self.seqs[slot]
+        # Hand the segment over: close our mapping without unlinking it, and keep the
+        # resource tracker from removing it when this process exits
+        snapshot.seqs = snapshot.frames = None
+        snapshot.shm.close()
+        resource_tracker.unregister(snapshot.shm._name, "shared_memory")
+        return {
+            "shm_name": snapshot.name,
+            "capacity": snapshot.capacity,
+            "shape": self.shape,
+            "start_seq": start_seq,
+            "count": count,
+        }
+
+    def read(self, start_seq, count):
+        """Copy frames `start_seq`..`start_seq + count - 1` out, skipping any already overwritten."""
+        frames, lost = [], 0
+        for seq in range(start_seq, start_seq + count):
+            slot = seq % self.capacity
+            if self.seqs[slot] != seq:
+                lost += 1
+                continue
+            frame = self.frames[slot].copy()
+            if self.seqs[slot] != seq:
+                lost += 1
+                continue
+            frames.append(frame)
+        if lost:
+            logger.warning(f"{lost} of {count} frames were overwritten before they could be read")
+        return frames
+
+    def close(self):
+        self.seqs = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def resolve_frames(payload):
+    """Turn the frames part of an alert (a shared-memory descriptor or a frame list) into frames."""
+    if not isinstance(payload, dict):
+        return list(payload)
+    ring = SharedFrameRing.attach(payload["shm_name"], payload["capacity"], payload["shape"])
+    try:
+        return ring.read(payload["start_seq"], payload["count"])
+    finally:
+        ring.close()
+
+
+def release_frames(payload):
+    """Free the snapshot segment behind an alert's frames once the alert is done with."""
+    if not isinstance(payload, dict) or "shm_name" not in payload:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=payload["shm_name"])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
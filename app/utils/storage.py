@@ -0,0 +1,210 @@
+import os
+import io
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
+
+from app import config
+
+logger = logging.getLogger("Storage")
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_s3_client(region=None, aws_access_key_id=None, aws_secret_access_key=None):
+    """
+    Process-wide S3 client per (region, credentials).
+
+    boto3 clients are thread-safe; sharing one keeps its connection pool (and TLS sessions)
+    alive across uploads instead of paying client construction and a handshake every time.
+    """
+    region = region or config.AWS_REGION
+    aws_access_key_id = aws_access_key_id or config.AWS_ACCESS_KEY_ID
+    aws_secret_access_key = aws_secret_access_key or config.AWS_SECRET_ACCESS_KEY
+    key = (region, aws_access_key_id, aws_secret_access_key)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = boto3.client(
+                's3',
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                region_name=region,
+                config=Config(
+                    max_pool_connections=config.S3_MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": config.UPLOAD_RETRIES, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                ),
+            )
+        return _clients[key]
+
+
+class S3MultipartUpload:
+    """
+    File-like writer that turns a byte stream into an S3 multipart upload.
+
+    Parts are sent as soon as `part_size` bytes have been buffered, so the upload
+    overlaps with whatever is producing the bytes (e.g. ffmpeg writing fragmented MP4).
+    """
+
+    def __init__(self, client, bucket, key, url, part_size=8 * 1024 * 1024):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.url = url
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.buffer = io.BytesIO()
+        self.parts = []
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+
+    def _flush_part(self):
+        body = self.buffer.getvalue()
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=part_number, Body=body)
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        self.buffer.write(data)
+        if self.buffer.tell() >= self.part_size:
+            self._flush_part()
+
+    def close(self):
+        if self.buffer.tell() or not self.parts:
+            self._flush_part()
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                              MultipartUpload={"Parts": self.parts})
+        logger.info(f"Uploaded {self.key} in {len(self.parts)} part(s)")
+        return self.url
+
+    def abort(self):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            logger.error(f"Error aborting upload of {self.key}: {e}")
+
+
+class LocalUpload:
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+        self.partial = f"{path}.part"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(self.partial, "wb")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        os.replace(self.partial, self.path)
+        return self.url
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.partial)
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    def __init__(self, bucket=None, region=None, part_size=8 * 1024 * 1024,
+                 aws_access_key_id=None, aws_secret_access_key=None):
+        self.bucket = bucket or config.AWS_BUCKET
+        self.region = region or config.AWS_REGION
+        self.part_size = part_size
+        self.client = get_s3_client(self.region, aws_access_key_id, aws_secret_access_key)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=config.UPLOAD_PART_CONCURRENCY,
+        )
+
+    def url(self, key):
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def open_upload(self, key):
+        return S3MultipartUpload(self.client, self.bucket, key, self.url(key), part_size=self.part_size)
+
+    def put_file(self, path, key):
+        self.client.upload_file(path, self.bucket, key, Config=self.transfer_config)
+        return self.url(key)
+
+    def put_bytes(self, data, key):
+        self.client.upload_fileobj(io.BytesIO(data), self.bucket, key, Config=self.transfer_config)
+        return self.url(key)
+
+
+class LocalStorage:
+    """Directory stand-in for S3, for tests and offline boxes."""
+
+    def __init__(self, root=None):
+        self.root = root or config.LOCAL_STORAGE_DIR
+
+    def url(self, key):
+        return f"file://{os.path.abspath(os.path.join(self.root, key))}"
+
+    def open_upload(self, key):
+        return LocalUpload(os.path.join(self.root, key), self.url(key))
+
+    def put_file(self, path, key):
+        destination = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        shutil.copyfile(path, destination)
+        return self.url(key)
+
+    def put_bytes(self, data, key):
+        upload = self.open_upload(key)
+        upload.write(data)
+        return upload.close()
+
+
+def create_storage():
+    if config.STORAGE_BACKEND == "local":
+        return LocalStorage()
+    return S3Storage()
+
+
+class Uploader:
+    """
+    Background upload service on top of a storage backend.
+
+    Uploads run on a bounded worker pool so callers (e.g. the chunk websocket loop) never
+    wait on the network. Retries are left to the S3 client (UPLOAD_RETRIES, adaptive mode),
+    so they happen per request and aren't multiplied by a second loop here. When
+    `max_pending` uploads are already queued, `submit_*` blocks, which bounds the memory
+    held by in-flight payloads.
+    """
+
+    def __init__(self, storage=None, workers=None, max_pending=None):
+        self.storage = storage or create_storage()
+        workers = workers or config.UPLOAD_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uploader")
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 4)
+
+    def url(self, key):
+        return self.storage.url(key)
+
+    def _submit(self, upload, *args):
+        self.slots.acquire()
+        future = self.executor.submit(upload, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def submit_file(self, path, key):
+        return self._submit(self.storage.put_file, path, key)
+
+    def submit_bytes(self, data, key):
+        return self._submit(self.storage.put_bytes, data, key)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class BoxTracker:
+    """
+    Constant-velocity IoU tracker used to carry person boxes between detector runs.
+
+    `update` matches fresh detections to the extrapolated tracks and re-estimates each
+    track's per-frame velocity; `step` advances every track by one frame.
+    """
+
+    def __init__(self, iou_threshold=0.3, smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.smoothing = smoothing
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.velocity = np.empty((0, 4), dtype=np.float32)
+        self.last_detection = np.empty((0, 4), dtype=np.float32)
+        self.frames_since_update = 0
+        self.changed = False
+
+    def update(self, detections):
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 4)
+        elapsed = self.frames_since_update + 1
+        velocity = np.zeros_like(detections)
+
+        iou = iou_matrix(detections, self.boxes)
+        matched = 0
+        while iou.size and iou.max() >= self.iou_threshold:
+            d, t = np.unravel_index(iou.argmax(), iou.shape)
+            measured = (detections[d] - self.last_detection[t]) / elapsed
+            velocity[d] = self.smoothing * measured + (1 - self.smoothing) * self.velocity[t]
+            iou[d, :] = -1
+            iou[:, t] = -1
+            matched += 1
+
+        # New or vanished people are a signal to look again soon
+        self.changed = matched != len(detections) or matched != len(self.boxes)
+        self.boxes = detections
+        self.last_detection = detections.copy()
+        self.velocity = velocity
+        self.frames_since_update = 0
+        return self.boxes.astype(int)
+
+    def step(self):
+        self.frames_since_update += 1
+        self.boxes = self.boxes + self.velocity
+        return self.boxes.astype(int)
+
+    def speed(self):
+        """Fastest track speed as a fraction of its box size per frame."""
+        if len(self.boxes) == 0:
+            return 0.0
+        size = np.maximum(self.boxes[:, 2:] - self.boxes[:, :2], 1.0)
+        centre_velocity = (self.velocity[:, :2] + self.velocity[:, 2:]) / 2
+        return float(np.max(np.abs(centre_velocity) / size))
+
+
+class DetectionScheduler:
+    """
+    Decides on which frames the detector runs.
+
+    The stride grows by one after every calm detection up to `max_stride` and falls back
+    to `min_stride` as soon as people move fast or appear / disappear.
+    """
+
+    def __init__(self, min_stride=1, max_stride=1, fast_motion=0.02):
+        self.min_stride = max(1, min_stride)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.fast_motion = fast_motion
+        self.stride = self.min_stride
+        self.frames_since_detection = None
+        self.detections = 0
+        self.frames = 0
+
+    def due(self):
+        self.frames += 1
+        if self.frames_since_detection is None or self.frames_since_detection + 1 >= self.stride:
+            self.frames_since_detection = 0
+            self.detections += 1
+            return True
+        self.frames_since_detection += 1
+        return False
+
+    def adapt(self, tracker):
+        if tracker.changed or tracker.speed() > self.fast_motion:
+            self.stride = self.min_stride
+        else:
+            self.stride = min(self.stride + 1, self.max_stride)
+
+    @property
+    def detection_rate(self):
+        return self.detections / self.frames if self.frames else 1.0
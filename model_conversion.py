@@ -1,22 +1,269 @@
-import tensorflow as tf
-import keras
-from keras.models import load_model
+import argparse
+import json
 import os
-from tensorflow.python.compiler.tensorrt import trt_convert as trt
-from tensorflow.python.saved_model import tag_constants
-import cv2
+
 import numpy as np
-import time
 
-model = load_model('parent_model_05_02.h5')
-model.save('./parentmodel/')
+CALIBRATION_EXTENSIONS = ('.ts', '.mp4', '.avi', '.mkv')
+
+
+def save_parent_model(h5_path='parent_model_05_02.h5', saved_model_dir='./parentmodel/'):
+    from keras.models import load_model
+
+    model = load_model(h5_path)
+    model.save(saved_model_dir)
+    return model
+
+
+def load_calibration_clips(clip_dir, frames=30, size=224, stride=15, max_clips=200, person_mask=True):
+    """
+    Cut recorded chunks (e.g. the .ts files ChunkReceiver stores) into model-ready clips.
+
+    Frames go through the same 640x480 -> 224x224 path as inference and, by default, are
+    masked by PreProcess (everything outside person boxes zeroed) so calibration and drift
+    are measured on what the model sees live. `person_mask=False` uses the raw frames.
+    """
+    import cv2
+
+    preprocess = None
+    if person_mask:
+        from app.utils.preprocess import PreProcess
+        preprocess = PreProcess()
+
+    clips = []
+    files = sorted(f for f in os.listdir(clip_dir) if f.lower().endswith(CALIBRATION_EXTENSIONS))
+    for name in files:
+        cap = cv2.VideoCapture(os.path.join(clip_dir, name))
+        window = []
+        while len(clips) < max_clips:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if preprocess is not None:
+                frame, _ = preprocess.preprocess_image(frame)
+            else:
+                frame = cv2.resize(cv2.resize(frame, (640, 480)), (size, size))
+            window.append(np.asarray(frame, dtype=np.float32))
+            if len(window) == frames:
+                clips.append(np.stack(window))
+                window = window[stride:]
+        cap.release()
+        if len(clips) >= max_clips:
+            break
+
+    if not clips:
+        raise ValueError(f'No {frames}-frame clips could be read from {clip_dir}')
+    print(f'Loaded {len(clips)} calibration clips from {len(files)} files in {clip_dir}')
+    return np.stack(clips)
+
+
+def split_clips(clips, eval_every=5):
+    """Hold every `eval_every`-th clip out of calibration so drift is measured on unseen data."""
+    held_out = np.zeros(len(clips), dtype=bool)
+    held_out[::eval_every] = True
+    if held_out.all():
+        raise ValueError(f'Need at least 2 calibration clips to hold one out for evaluation, got {len(clips)}')
+    return clips[~held_out], clips[held_out]
+
+
+def convert_tftrt(saved_model_dir='./parentmodel/', output_dir='./app/models/14_02', precision='FP32',
+                  calibration_clips=None):
+    from tensorflow.python.compiler.tensorrt import trt_convert as trt
+
+    print(f'Converting to TF-TRT {precision}...')
+    conversion_params = trt.DEFAULT_TRT_CONVERSION_PARAMS._replace(precision_mode=getattr(trt.TrtPrecisionMode, precision),max_workspace_size_bytes=1<<30)
+                                                                  #  max_workspace_size_bytes=8000000000)
+
+    converter = trt.TrtGraphConverterV2(input_saved_model_dir=saved_model_dir,
+                                        conversion_params=conversion_params,use_dynamic_shape = True)
+    if precision == 'INT8':
+        if calibration_clips is None:
+            raise ValueError('INT8 conversion needs --calibration-dir')
+        converter.convert(calibration_input_fn=lambda: ((clip[None],) for clip in calibration_clips))
+    else:
+        converter.convert()
+    converter.save(output_saved_model_dir=output_dir)
+    print(f'Done Converting to TF-TRT {precision}')
+    return output_dir
+
+
+def quantize_onnx_int8(onnx_path, output_path, calibration_clips):
+    """Static INT8 post-training quantization (QDQ, per-channel weights) for the ONNX Runtime CPU backend."""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class ClipCalibrationReader(CalibrationDataReader):
+        """Feeds calibration clips one at a time to the static quantizer."""
+
+        def __init__(self, input_name, clips):
+            self.input_name = input_name
+            self.clips = iter(clips)
+
+        def get_next(self):
+            clip = next(self.clips, None)
+            return None if clip is None else {self.input_name: clip[None]}
+
+    input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+    reader = ClipCalibrationReader(input_name, calibration_clips)
+
+    print(f'Quantizing {onnx_path} to INT8 with {len(calibration_clips)} calibration clips...')
+    quantize_static(onnx_path, output_path, reader, quant_format=QuantFormat.QDQ,
+                    per_channel=True, activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    print(f'Done quantizing to {output_path}')
+    return output_path
+
+
+def convert_onnx_fp16(onnx_path, output_path):
+    import onnx
+    from onnxconverter_common import float16
+
+    print(f'Converting {onnx_path} to FP16...')
+    model = float16.convert_float_to_float16(onnx.load(onnx_path), keep_io_types=True)
+    onnx.save(model, output_path)
+    print(f'Done converting to {output_path}')
+    return output_path
+
+
+def report_drift(reference_path, candidate_path, clips, reference_backend, candidate_backend,
+                 threshold=0.7, report_path=None):
+    """Compare theft probabilities of a converted model against the FP32 reference on held-out clips."""
+    from app.models.theft_inference import load_backend
+
+    reference = load_backend(reference_path, backend=reference_backend)
+    candidate = load_backend(candidate_path, backend=candidate_backend)
+
+    expected = np.concatenate([reference(clip[None])[:, 1] for clip in clips])
+    actual = np.concatenate([candidate(clip[None])[:, 1] for clip in clips])
+    drift = np.abs(actual - expected)
+
+    report = {
+        'reference': reference_path,
+        'candidate': candidate_path,
+        'clips': int(len(clips)),
+        'mean_abs_drift': float(drift.mean()),
+        'max_abs_drift': float(drift.max()),
+        'p95_abs_drift': float(np.percentile(drift, 95)),
+        'threshold': threshold,
+        'decision_agreement': float(np.mean((expected > threshold) == (actual > threshold))),
+    }
+    print(json.dumps(report, indent=2))
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def export_onnx(model, output_path='./app/models/theft.onnx', frames=30, size=224, opset=17):
+    """Export the Keras model to ONNX with a dynamic batch dimension for ONNX Runtime / OpenVINO."""
+    import tensorflow as tf
+    import tf2onnx
+
+    print('Exporting to ONNX...')
+    input_signature = [tf.TensorSpec((None, frames, size, size, 3), tf.float32, name='clip')]
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=opset, output_path=output_path)
+    print(f'Done exporting ONNX model to {output_path}')
+    return output_path
+
+
+def export_openvino(onnx_path, output_path='./app/models/theft_openvino/theft.xml'):
+    import openvino as ov
+
+    print('Converting ONNX model to OpenVINO IR...')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    ov.save_model(ov.convert_model(onnx_path), output_path)
+    print(f'Done converting OpenVINO IR to {output_path}')
+    return output_path
+
+
+def export_split(model, encoder_dir='./app/models/theft_encoder', head_dir='./app/models/theft_head', size=224):
+    """
+    Split the clip model at its last TimeDistributed layer into the per-frame encoder and
+    temporal head used by SplitTheftInference (ENCODER_MODEL_PATH / HEAD_MODEL_PATH).
+
+    The encoder maps a batch of frames (n, size, size, 3) to per-frame features and the head
+    maps stacked features (batch, frames, ...) to class probabilities. Only models that are
+    a plain chain of layers can be split this way.
+    """
+    import keras
+
+    layers = [layer for layer in model.layers if not isinstance(layer, keras.layers.InputLayer)]
+    split = max((i for i, layer in enumerate(layers) if isinstance(layer, keras.layers.TimeDistributed)), default=None)
+    if split is None or not all(isinstance(layer, keras.layers.TimeDistributed) for layer in layers[:split + 1]):
+        raise ValueError('The model must start with TimeDistributed per-frame layers to be split into encoder and head')
+
+    print('Splitting model into per-frame encoder and temporal head...')
+    frame = keras.Input((size, size, 3), name='frame')
+    x = frame
+    for layer in layers[:split + 1]:
+        x = layer.layer(x)
+    encoder = keras.Model(frame, x, name='theft_encoder')
+
+    features = keras.Input(tuple(layers[split].output.shape[1:]), name='features')
+    y = features
+    for layer in layers[split + 1:]:
+        y = layer(y)
+    head = keras.Model(features, y, name='theft_head')
+
+    encoder.save(encoder_dir)
+    head.save(head_dir)
+    print(f'Done exporting encoder to {encoder_dir} and head to {head_dir}')
+    return encoder_dir, head_dir
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert the theft action model for deployment')
+    parser.add_argument('--h5', default='parent_model_05_02.h5')
+    parser.add_argument('--target', choices=['tftrt', 'tftrt-fp16', 'tftrt-int8', 'onnx', 'onnx-fp16',
+                                             'onnx-int8', 'openvino', 'split'], default='tftrt',
+                        help="'split' writes the encoder/head SavedModels for ENCODER_MODEL_PATH / HEAD_MODEL_PATH")
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--frames', type=int, default=int(os.getenv('FRAME_LENGTH', 30)))
+    parser.add_argument('--calibration-dir', default=None,
+                        help='directory of recorded clips (.ts chunks) used for calibration and drift report')
+    parser.add_argument('--max-clips', type=int, default=200)
+    parser.add_argument('--person-mask', action=argparse.BooleanOptionalAction, default=True,
+                        help='mask calibration frames with the YOLO person gate like live inference '
+                             '(default); --no-person-mask uses the raw frames')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('THEFT_THRESHOLD', 0.7)))
+    parser.add_argument('--report', default=None, help='write the drift report as JSON to this path')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    model = save_parent_model(args.h5)
+
+    calibration_clips, eval_clips = None, None
+    if args.calibration_dir:
+        clips = load_calibration_clips(args.calibration_dir, frames=args.frames, max_clips=args.max_clips,
+                                       person_mask=args.person_mask)
+        calibration_clips, eval_clips = split_clips(clips)
 
-print('Converting to TF-TRT FP32...')
-conversion_params = trt.DEFAULT_TRT_CONVERSION_PARAMS._replace(precision_mode=trt.TrtPrecisionMode.FP32,max_workspace_size_bytes=1<<30)
-                                                              #  max_workspace_size_bytes=8000000000)
+    reference, output, backend = './parentmodel/', None, 'tensorflow'
+    if args.target.startswith('tftrt'):
+        precision = {'tftrt': 'FP32', 'tftrt-fp16': 'FP16', 'tftrt-int8': 'INT8'}[args.target]
+        default_output = './app/models/14_02' if precision == 'FP32' else f'./app/models/14_02_{precision.lower()}'
+        output = convert_tftrt(output_dir=args.output or default_output,
+                               precision=precision, calibration_clips=calibration_clips)
+    elif args.target == 'split':
+        # --output names the encoder directory; the head goes next to it
+        encoder_dir = args.output or './app/models/theft_encoder'
+        export_split(model, encoder_dir=encoder_dir, head_dir=os.path.join(os.path.dirname(encoder_dir) or '.', 'theft_head'))
+        output = reference  # the split models are not a drop-in clip model, so there's no drift to report
+    elif args.target == 'openvino':
+        onnx_path = export_onnx(model, frames=args.frames)
+        output = export_openvino(onnx_path, output_path=args.output or './app/models/theft_openvino/theft.xml')
+        backend = 'openvino'
+    else:
+        onnx_path = export_onnx(model, frames=args.frames)
+        reference, output, backend = onnx_path, onnx_path, 'onnxruntime'
+        if args.target == 'onnx-fp16':
+            output = convert_onnx_fp16(onnx_path, args.output or './app/models/theft_fp16.onnx')
+        elif args.target == 'onnx-int8':
+            if calibration_clips is None:
+                raise ValueError('INT8 quantization needs --calibration-dir')
+            output = quantize_onnx_int8(onnx_path, args.output or './app/models/theft_int8.onnx', calibration_clips)
 
-converter = trt.TrtGraphConverterV2(input_saved_model_dir='./parentmodel/',
-                                    conversion_params=conversion_params,use_dynamic_shape = True)
-converter.convert()
-converter.save(output_saved_model_dir='./app/models/14_02')
-print('Done Converting to TF-TRT FP32')
\ No newline at end of file
+    if eval_clips is not None and output != reference:
+        report_drift(reference, output, eval_clips, reference_backend='onnxruntime' if reference.endswith('.onnx') else 'tensorflow',
+                     candidate_backend=backend, threshold=args.threshold, report_path=args.report)
@@ -0,0 +1,86 @@
+import pytest
+
+redis = pytest.importorskip("redis")
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.utils import common
+
+QUEUE = "alerts"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(common.redis, "StrictRedis", lambda **kwargs: fakeredis.FakeStrictRedis(server=server))
+    return common.CacheHelper.__wrapped__()
+
+
+def test_pop_moves_event_to_processing_until_acked(cache):
+    cache.push_event(QUEUE, ["first"])
+    cache.push_event(QUEUE, ["second"])
+
+    token, event = cache.pop_event(QUEUE, timeout=1)
+    assert event == ["first"]
+    assert cache.redis_cache.lrange(cache.processing_key(QUEUE), 0, -1) == [token]
+
+    cache.ack_event(QUEUE, token)
+    assert cache.redis_cache.llen(cache.processing_key(QUEUE)) == 0
+    assert cache.pop_event(QUEUE, timeout=1)[1] == ["second"]
+
+
+def test_failed_event_is_retried_first_then_dead_lettered(cache):
+    cache.push_event(QUEUE, ["alert"])
+    cache.push_event(QUEUE, ["next"])
+
+    for attempt in (1, 2):
+        token, event = cache.pop_event(QUEUE, timeout=1)
+        assert event == ["alert"]
+        assert cache.fail_event(QUEUE, token, max_attempts=3) == attempt
+
+    token, event = cache.pop_event(QUEUE, timeout=1)
+    assert event == ["alert"]
+    assert cache.fail_event(QUEUE, token, max_attempts=3) == 3
+
+    assert cache.redis_cache.lrange(cache.failed_key(QUEUE), 0, -1) == [token]
+    assert cache.redis_cache.llen(cache.processing_key(QUEUE)) == 0
+    assert not cache.redis_cache.exists(cache.attempts_key(QUEUE))
+    assert cache.pop_event(QUEUE, timeout=1)[1] == ["next"]
+
+
+def test_ack_clears_attempt_count(cache):
+    cache.push_event(QUEUE, ["alert"])
+    token, _ = cache.pop_event(QUEUE, timeout=1)
+    cache.fail_event(QUEUE, token, max_attempts=3)
+
+    token, _ = cache.pop_event(QUEUE, timeout=1)
+    cache.ack_event(QUEUE, token)
+    assert not cache.redis_cache.hexists(cache.attempts_key(QUEUE), token)
+
+
+def test_requeue_unacked_restores_oldest_first(cache):
+    for name in ("a", "b", "c"):
+        cache.push_event(QUEUE, [name])
+    cache.pop_event(QUEUE, timeout=1)
+    cache.pop_event(QUEUE, timeout=1)
+
+    assert cache.requeue_unacked(QUEUE) == 2
+    assert cache.redis_cache.llen(cache.processing_key(QUEUE)) == 0
+    assert [cache.pop_event(QUEUE, timeout=1)[1] for _ in range(3)] == [["a"], ["b"], ["c"]]
+
+
+def test_pop_backs_off_while_redis_is_down(cache, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(common.time, "sleep", sleeps.append)
+
+    def down(*args, **kwargs):
+        raise redis.ConnectionError("down")
+
+    monkeypatch.setattr(cache.blocking_cache, "blmove", down)
+    for _ in range(6):
+        assert cache.pop_event(QUEUE, timeout=1) is None
+    assert sleeps == [2, 4, 8, 16, 30, 30]
+
+    monkeypatch.undo()
+    cache.push_event(QUEUE, ["back"])
+    assert cache.pop_event(QUEUE, timeout=1)[1] == ["back"]
+    assert cache.pop_failures == 0
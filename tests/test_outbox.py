@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.utils import outbox as outbox_module
+from app.utils.outbox import Outbox, OutboxDispatcher
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(outbox_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def outbox(tmp_path, clock):
+    box = Outbox(str(tmp_path / "outbox.db"), ["kafka", "rabbitmq"], max_backoff=30.0)
+    yield box
+    box.close()
+
+
+def test_append_is_idempotent(outbox):
+    assert outbox.append("trace-1", {"n": 1})
+    assert not outbox.append("trace-1", {"n": 2})
+    assert outbox.exists("trace-1")
+    assert outbox.pending("kafka") == [(1, "trace-1", {"n": 1})]
+    assert outbox.backlog() == {"kafka": 1, "rabbitmq": 1}
+
+
+def test_events_survive_reopening(tmp_path, clock):
+    path = str(tmp_path / "outbox.db")
+    box = Outbox(path, ["kafka"])
+    box.append("trace-1", {"n": 1})
+    box.close()
+
+    box = Outbox(path, ["kafka"])
+    assert [key for _, key, _ in box.pending("kafka")] == ["trace-1"]
+    box.close()
+
+
+def test_sinks_are_delivered_independently(outbox):
+    outbox.append("trace-1", {})
+    outbox.append("trace-2", {})
+
+    outbox.mark_delivered("kafka", [1, 2])
+    assert outbox.pending("kafka") == []
+    assert [key for _, key, _ in outbox.pending("rabbitmq")] == ["trace-1", "trace-2"]
+    assert outbox.backlog() == {"rabbitmq": 2}
+
+
+def test_failed_delivery_backs_off_exponentially_up_to_the_cap(outbox, clock):
+    outbox.append("trace-1", {})
+
+    for delay in (1, 2, 4, 8, 16, 30, 30):
+        outbox.mark_failed("kafka", [1], RuntimeError("broker down"))
+        clock.now += delay - 0.5
+        assert outbox.pending("kafka") == []
+        clock.now += 0.5
+        assert len(outbox.pending("kafka")) == 1
+
+    # The other sink is not held back by kafka's failures
+    assert len(outbox.pending("rabbitmq")) == 1
+
+
+def test_purge_keeps_events_until_every_sink_has_them(outbox, clock):
+    outbox.append("delivered", {})
+    outbox.append("half", {})
+    outbox.mark_delivered("kafka", [1, 2])
+    outbox.mark_delivered("rabbitmq", [1])
+
+    clock.now += 100
+    outbox.purge(older_than=50)
+    assert not outbox.exists("delivered")
+    assert outbox.exists("half")
+    assert outbox.backlog() == {"rabbitmq": 1}
+
+
+def test_purge_respects_retention(outbox, clock):
+    outbox.append("recent", {})
+    outbox.mark_delivered("kafka", [1])
+    outbox.mark_delivered("rabbitmq", [1])
+
+    clock.now += 10
+    outbox.purge(older_than=50)
+    assert outbox.exists("recent")
+
+
+def test_dispatcher_marks_each_sink_by_its_own_result(outbox):
+    outbox.append("trace-1", {"n": 1})
+    outbox.append("trace-2", {"n": 2})
+    received = []
+
+    async def ok(batch):
+        received.extend(batch)
+
+    async def down(batch):
+        raise ConnectionError("down")
+
+    dispatcher = OutboxDispatcher(outbox, {"kafka": ok, "rabbitmq": down}, batch_size=1)
+    assert asyncio.run(dispatcher._drain("kafka", ok)) == 2
+    assert asyncio.run(dispatcher._drain("rabbitmq", down)) == 0
+
+    assert received == [("trace-1", {"n": 1}), ("trace-2", {"n": 2})]
+    assert outbox.backlog() == {"rabbitmq": 2}